@@ -1,105 +1,365 @@
 import requests
-from bs4 import BeautifulSoup, Comment
-from urllib.parse import urljoin, urlparse
-from PyPDF2 import PdfReader
-from dotenv import load_dotenv
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlsplit, urlunsplit
+import argparse
+import codecs
+import contextvars
+import functools
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import mmap
 import os
-import sys
-import tiktoken
-import nltk
-from nltk.corpus import stopwords
+import tarfile
 import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from html.entities import html5 as html_entities
+from html.parser import HTMLParser
 from pathlib import Path
-import nbformat
-from nbconvert import PythonExporter
-from youtube_transcript_api import YouTubeTranscriptApi
-from youtube_transcript_api.formatters import TextFormatter
-import pyperclip
-import wget
-from tqdm import tqdm
-from time import sleep
-from rich import print
 from rich.console import Console
-from rich.panel import Panel
-from rich.text import Text
-from rich.prompt import Prompt
-from rich.style import Style
-from rich.syntax import Syntax
-from rich.traceback import install
-from rich.progress import Progress, TextColumn, BarColumn, TimeRemainingColumn
+
+# Heavy dependencies (bs4, PyPDF2, nltk, tiktoken, nbconvert, youtube_transcript_api, pyperclip and most
+# of rich) are imported inside the handlers that use them, so startup only pays for the source type in use
 
 ### FLAGS ###
 enable_clipboard = False
+local_read_workers = min(32, (os.cpu_count() or 1) + 4)
+ingest_max_file_bytes = 8 * 1024 ** 2  # larger files are skipped without being read
+ingest_max_total_bytes = None  # files past this many bytes in total are skipped
+ingest_mmap_min_bytes = 1024 ** 2  # files at least this large are memory-mapped instead of copied into memory
+ingest_sniff_bytes = 64 * 1024  # leading block checked for binary content and minified lines
+ingest_max_line_length = 4000  # a longer line in the leading block marks a file of these types as minified / generated
+minified_file_extensions = (".js", ".mjs", ".cjs", ".css", ".html", ".htm", ".svg")
+ingest_generated_policy = "skip"  # "skip", "truncate" (to ingest_truncate_bytes) or "keep" minified / generated files
+ingest_truncate_bytes = 16 * 1024
+generated_file_patterns = [
+    r"\.min\.(js|css)$", r"\.(bundle|chunk)\.js$", r"\.map$", r"_pb2\.py$", r"\.pb\.go$",
+    r"(^|/)(package-lock|npm-shrinkwrap)\.json$", r"(^|/)pnpm-lock\.yaml$", r"\.lock$",
+]
+batch_workers = 4  # inputs processed at once in batch mode
+crawl_workers = 8
+crawl_max_per_host = 4
+crawl_timeout = 30
+crawl_chunk_size = 64 * 1024
+crawl_resume = False  # continue the crawl recorded in the state store instead of starting over
+crawl_keep_state = False  # keep the state store, which holds the text of every page, after a crawl completes
+crawl_checkpoint_seconds = 15
+crawl_max_depth = 2
+crawl_sitemap = False  # seed the frontier from robots.txt / sitemap.xml and skip pages unchanged since their lastmod
+crawl_strip_boilerplate = False  # drop navigation, sidebar and footer text repeated across crawled pages
+boilerplate_threshold = 0.5  # fraction of pages a line must appear on to count as boilerplate
+boilerplate_min_pages = 5  # smaller crawls are written unfiltered
+boilerplate_min_words = 4  # shorter repeated lines are only dropped next to other boilerplate, e.g. in a nav list
+boilerplate_minhash_words = 8  # lines at least this long are also matched as near-duplicates...
+boilerplate_similarity = 0.4  # ...of the first line of a class whose word 3-grams overlap theirs at least this much (Jaccard)
+github_fetch_mode = "archive"  # "archive" (one tarball download), "trees" (tree listing + cached blobs) or "contents" (per-directory API calls)
+github_workers = 8
+github_timeout = 60  # seconds a GitHub download may stall before it fails
+github_api_url = "https://api.github.com"  # point at a GitHub Enterprise or stand-in API
+cache_dir = os.path.join(Path.home(), ".cache", "1filellm")
+http_cache_dir = os.path.join(cache_dir, "http")
+http_cache_max_bytes = 2 * 1024 ** 3
+# Seconds a cached response is served without revalidation, per source type
+http_cache_ttl = {
+    "page": 6 * 3600,
+    "pdf": 30 * 86400,
+    "github": 0,
+    "raw": 86400,
+}
+offline_mode = False
+token_count_threads = os.cpu_count() or 1
+token_chunk_size = 256 * 1024
+token_report_rows = 15
+stopwords_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stopwords.txt")
+compress_chunk_size = 1024 * 1024
+pdf_workers = os.cpu_count() or 1
+pdf_parallel_min_pages = 64  # smaller documents are extracted in-process
+pdf_batch_pages = 16
+pdf_page_range = None  # (first, last), 1-based and inclusive; last is None to run to the end
+pdf_max_pages = None
+stats_per_file = False  # also break stage timings down per file / URL in stats.json
+profile_mode = None  # "cprofile" or "tracemalloc" to profile the whole run
+notebook_use_nbconvert = False  # the built-in extractor emits the same layout as nbconvert's PythonExporter
+notebook_include_outputs = False  # PythonExporter drops cell outputs; enable to append text outputs as comments
+notebook_execution_counts = True
+notebook_drop_images = True  # base64 images in outputs and inline data: URIs in markdown
+pack_max_tokens = None  # token budget for local folders and repositories; files that do not fit are listed in a trailer
+# Packing order under a token budget: the first matching pattern gives the rank, lower ranks and then smaller files go first
+pack_priorities = [
+    (r"(^|/)readme[^/]*$", 0),
+    (r"(^|/)(tests?|__tests__|spec)/|(^|/)test_[^/]*$|_test\.\w+$|\.(test|spec)\.\w+$", 3),
+    (r"(^|/)(docs?|documentation)/|\.(md|rst|txt)$", 1),
+]
+pack_default_priority = 2
+pack_trailer_files = 20  # omitted files listed by name in the trailer; the rest are only counted
+shard_max_bytes = None  # split the uncompressed output into shards of at most this many bytes...
+shard_max_tokens = None  # ...and/or tokens; shards are only cut between files / URLs
+
+ext_categories = {
+    "c_like":    { "ext_list": ['.c', '.h'], "enabled": 1 },
+    "web":       { "ext_list": ['.html', '.css', '.js', '.ts', '.tsx'], "enabled": 1 },
+    "data":      { "ext_list": ['.csv', '.json', '.jsonl', '.toml', '.yaml'], "enabled": 1 },
+    "python":    { "ext_list": ['.py', '.pyx', '.ipynb'], "enabled": 1 },
+    "scripting": { "ext_list": ['.sh', '.cjs'], "enabled": 1 },
+    "rust":      { "ext_list": ['.rs'], "enabled": 1 },
+    "markdown":  { "ext_list": ['.md'], "enabled": 1 },
+    "sql":       { "ext_list": ['.sql'], "enabled": 1 },
+    "config":    { "ext_list": ['.toml', '.yaml', '.cfg', '.env', '.env.example', '.example'], "enabled": 1 },
+    "misc":      { "ext_list": ['.localhost', '.txt'], "enabled": 1 }
+}
+
+# Define path exclude patterns
+default_exclude_paths = [
+    r'.*pip.*',
+    r'.*_internal.*',
+    r'\.env|\.venv|venv',
+    r'\.git*|\.vscode|\.*cache.*|.*__pycache__.*|.*node_modules.*|.*dist.*|.*build.*|.*logs.*|.*tmp.*|.*temp',
+]
+use_ignore_files = True
+ignore_file_names = (".gitignore", ".1fileignore")
 
 console = Console()
 allowed_extensions = []
 exclude_paths = []
+allowed_suffixes = frozenset()
+excluded_suffixes = frozenset()
+exclude_pattern = None
+exclude_decisions = {}
+generated_file_pattern = None
+ingest_lock = threading.Lock()
+pdf_worker_reader = None
+pdf_pool = None
+pdf_pool_lock = threading.Lock()
+http_session = None
+http_session_lock = threading.Lock()
+host_slots = {}
+host_slots_lock = threading.Lock()
+http_cache_lock = threading.Lock()
+http_cache_size = None
+http_cache_pins = {}  # body digest -> requests currently using it; eviction leaves these alone
 
 def set_filters():
-    ext_categories = {
-        "c_like":    { "ext_list": ['.c', '.h'], "enabled": 1 },
-        "web":       { "ext_list": ['.html', '.css', '.js', '.ts', '.tsx'], "enabled": 1 },
-        "data":      { "ext_list": ['.csv', '.json', '.jsonl', '.toml', '.yaml'], "enabled": 1 },
-        "python":    { "ext_list": ['.py', '.pyx', '.ipynb'], "enabled": 1 },
-        "scripting": { "ext_list": ['.sh', '.cjs'], "enabled": 1 },
-        "rust":      { "ext_list": ['.rs'], "enabled": 1 },
-        "markdown":  { "ext_list": ['.md'], "enabled": 1 },
-        "sql":       { "ext_list": ['.sql'], "enabled": 1 },
-        "config":    { "ext_list": ['.toml', '.yaml', '.cfg', '.env', '.env.example', '.example'], "enabled": 1 },
-        "misc":      { "ext_list": ['.localhost', '.txt'], "enabled": 1 }
-    }
-    _allowed = []
+    # Compiles the filters from ext_categories and default_exclude_paths; safe to call again after changing either
+    global allowed_suffixes, excluded_suffixes, exclude_pattern, generated_file_pattern
+    _allowed = sorted({ext for data in ext_categories.values() if data["enabled"] for ext in data["ext_list"]})
 
     console.print("\nAllowed File Types:\n", style="bold chartreuse1 underline")
     for cat, data in ext_categories.items():
         if data["enabled"]:
-            _allowed.extend(data["ext_list"])
-            _allowed = sorted(_allowed)
-            allowed_extensions.extend(_allowed)
             console.print(f"{cat} => ({data['ext_list']})", style="aquamarine3")
     console.print("\n")
 
-    # Define path exclude patterns
-    exclude_paths.extend([
-        re.compile(r'.*pip.*'),
-        re.compile(r'.*_internal.*'),
-        re.compile(r'\.env|\.venv|venv'),
-        re.compile(r'\.git*|\.vscode|\.*cache.*|.*__pycache__.*|.*node_modules.*|.*dist.*|.*build.*|.*logs.*|.*tmp.*|.*temp')
-    ])
+    allowed_extensions[:] = _allowed
+    exclude_paths[:] = [re.compile(pattern) for pattern in default_exclude_paths]
+
+    # ex. scenario: include all '.txt' files except for 'output.txt' or 'log.txt'
+    excluded_suffixes = frozenset(['.output.txt', '.log.txt'])
+    allowed_suffixes = frozenset(_allowed)
+    exclude_pattern = re.compile("|".join(f"(?:{pattern.pattern})" for pattern in exclude_paths))
+    exclude_decisions.clear()
+    generated_file_pattern = re.compile("|".join(f"(?:{pattern})" for pattern in generated_file_patterns))
 
 def should_exclude(dir_name):
-    for pattern in exclude_paths:
-        if pattern.search(dir_name):
-            return True
-    return False
+    # Decisions are cached per directory; archive and tree listings ask about the same directory once per file
+    excluded = exclude_decisions.get(dir_name)
+    if excluded is None:
+        excluded = exclude_decisions[dir_name] = bool(exclude_pattern and exclude_pattern.search(dir_name))
+    return excluded
 
 def is_allowed_filetype(filename):
-    # ex. scenario: include all '.txt' files except for 'output.txt' or 'log.txt'
-    excluded_extensions = ['.output.txt', '.log.txt']
-    for ext in excluded_extensions:
-        if filename.endswith(ext):
+    # Every extension starts with a ".", so `filename.endswith(ext)` holds exactly when ext is one of the
+    # suffixes starting at a "." in the base name; those few suffixes are looked up in sets
+    base_name = filename[max(filename.rfind("/"), filename.rfind(os.sep)) + 1:]
+    suffixes = []
+    pos = base_name.find(".")
+    while pos >= 0:
+        suffixes.append(base_name[pos:])
+        pos = base_name.find(".", pos + 1)
+
+    for ext in suffixes:
+        if ext in excluded_suffixes:
             console.print(f"Excluded: {filename} ({ext})", style="bold red")
             return False
 
-    for ext in allowed_extensions:
-        if filename.endswith(ext):
-            return True
-
-    ext = filename.split('.')[-1] if '.' in filename else 'no_extension'
-    return False
+    return any(ext in allowed_suffixes for ext in suffixes)
+
+def compile_ignore_pattern(pattern):
+    # Translates one .gitignore line into (regex, negated, directory_only); the regex matches paths relative
+    # to the directory holding the ignore file
+    negated = pattern.startswith("!")
+    if negated:
+        pattern = pattern[1:]
+    elif pattern.startswith("\\"):
+        pattern = pattern[1:]
+    directory_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+
+    regex = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            regex.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            regex.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            regex.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            members = pattern[i + 1:end]
+            if members.startswith("!"):
+                members = "^" + members[1:]
+            regex.append("[" + members.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < len(pattern):
+            regex.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            regex.append(re.escape(pattern[i]))
+            i += 1
+
+    prefix = "" if anchored else "(?:.*/)?"
+    return re.compile(prefix + "".join(regex) + r"\Z"), negated, directory_only
+
+def load_ignore_rules(dir_path, rel_dir):
+    rules = []
+    for name in ignore_file_names:
+        try:
+            with open(os.path.join(dir_path, name), "r", encoding="utf-8", errors="ignore") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            line = line.rstrip()
+            if line and not line.startswith("#"):
+                rules.append((rel_dir, *compile_ignore_pattern(line)))
+    return rules
+
+def is_ignored(rules, rel_path, is_dir):
+    # The last matching rule wins, and rules from deeper ignore files come after their parents'
+    ignored = False
+    for base, regex, negated, directory_only in rules:
+        if directory_only and not is_dir:
+            continue
+        if base:
+            if not rel_path.startswith(base + "/"):
+                continue
+            rel_path_in_base = rel_path[len(base) + 1:]
+        else:
+            rel_path_in_base = rel_path
+        if regex.match(rel_path_in_base):
+            ignored = not negated
+    return ignored
 
 def safe_file_read(filepath, fallback_encoding="latin1"):
+    # One read; the fallback encoding is only tried on the bytes already in memory
+    with open(filepath, "rb") as file:
+        data = file.read()
+    return decode_bytes(data, fallback_encoding)
+
+text_boms = [
+    (codecs.BOM_UTF32_LE, "utf-32-le"), (codecs.BOM_UTF32_BE, "utf-32-be"), (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"), (codecs.BOM_UTF16_BE, "utf-16-be"),
+]
+# Signatures long enough that no text file starts with them by chance. Formats whose signature is short
+# printable text, such as "MZ" executables, have NUL bytes early on and are caught by that check instead
+binary_magic_numbers = (
+    b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"%PDF", b"PK\x03\x04", b"\x1f\x8b", b"\xfd7zXZ", b"7z\xbc\xaf",
+    b"Rar!", b"\x7fELF", b"\xca\xfe\xba\xbe", b"\xcf\xfa\xed\xfe", b"\x00asm", b"SQLite format 3", b"RIFF",
+    b"OggS", b"ID3\x02\x00", b"ID3\x03\x00", b"ID3\x04\x00", b"wOFF", b"wOF2", b"\x00\x01\x00\x00",
+    *(b"BZh%d1AY&SY" % level for level in range(1, 10)),
+)
+
+def detect_bom(head):
+    for bom, encoding in text_boms:
+        if head.startswith(bom):
+            return bom, encoding
+    return b"", None
+
+def sniff_file(path, head):
+    # "binary", "minified" or None from the leading block of a file. Only code and markup is checked for
+    # minified lines: long lines are normal in prose, CSV / JSONL data, SQL dumps and base64 fixtures
+    bom, _ = detect_bom(head)
+    if not bom and (head.startswith(binary_magic_numbers) or b"\0" in head):
+        return "binary"
+    if (
+        path.lower().endswith(minified_file_extensions)
+        and len(head) > ingest_max_line_length
+        and max(map(len, head.split(b"\n"))) > ingest_max_line_length
+    ):
+        return "minified"
+    return None
+
+def translate_newlines(text):
+    # Same result as reading in text mode with universal newlines
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+def decode_bytes(data, fallback_encoding="latin1"):
+    # A BOM decides the encoding; otherwise UTF-8, dropping stray invalid bytes like errors="ignore" did,
+    # unless so many are invalid (over 1%) that the file is clearly in a legacy single-byte encoding
+    bom, encoding = detect_bom(data[:4])
+    if encoding:
+        return translate_newlines(str(data[len(bom):] if bom else data, encoding, "replace"))
     try:
-        with open(filepath, "r", encoding="utf-8") as file:
-            return file.read()
+        return translate_newlines(str(data, "utf-8"))
     except UnicodeDecodeError:
-        with open(filepath, "r", encoding=fallback_encoding) as file:
-            return file.read()
-
-nltk.download("stopwords", quiet=True)
-stop_words = set(stopwords.words("english"))
+        data = bytes(data)
+    replaced = str(data, "utf-8", "replace")
+    invalid = replaced.count("\ufffd") - data.count("\ufffd".encode("utf-8"))
+    if invalid * 100 > len(data):
+        return translate_newlines(str(data, fallback_encoding))
+    return translate_newlines(str(data, "utf-8", "ignore"))
+
+def skip_reason_before_read(path, size):
+    # Name and size checks that need no file content. Called in listing order from the main thread, so the
+    # files that fit under the total cap are the same on every run
+    if generated_file_pattern and generated_file_pattern.search(path.replace(os.sep, "/")) and ingest_generated_policy == "skip":
+        return "generated"
+    if ingest_max_file_bytes and size > ingest_max_file_bytes:
+        return "too large"
+    if ingest_max_total_bytes:
+        with ingest_lock:
+            if run_stats.ingested_bytes + size > ingest_max_total_bytes:
+                return "total size cap"
+            run_stats.ingested_bytes += size
+    return None
+
+def skip_file(path, size, reason):
+    console.print(f"Skipping {path} ({reason})", style="bold yellow")
+    run_stats.skip(reason, size, file=path)
+
+@functools.lru_cache(maxsize=None)
+def get_stop_words():
+    # Read from the word list shipped next to this script instead of nltk.download, so no network call is made
+    try:
+        with open(stopwords_file, "r", encoding="utf-8") as f:
+            return frozenset(f.read().split())
+    except OSError:
+        from nltk.corpus import stopwords
+        return frozenset(stopwords.words("english"))
 
 def github_auth_headers():
+    from dotenv import load_dotenv
+
     # Get GitHub token from environment or local .env
     load_dotenv()
     TOKEN = os.getenv("GITHUB_TOKEN")
@@ -109,7 +369,10 @@ def github_auth_headers():
 
 def download_file(url, target_path):
     headers = github_auth_headers()
+    start = time.perf_counter()
     response = requests.get(url, headers=headers)
+    run_stats.request(time.perf_counter() - start, response.status_code, len(response.content))
+    run_stats.add("fetch", time.perf_counter() - start, len(response.content), file=url)
     response.raise_for_status()
     with open(target_path, "wb") as f:
         f.write(response.content)
@@ -118,12 +381,99 @@ def process_ipynb_file(temp_file):
     with open(temp_file, "r", encoding="utf-8", errors="ignore") as f:
         notebook_content = f.read()
 
+    return convert_ipynb(notebook_content)
+
+def convert_ipynb(notebook_content, file=None):
+    start = time.perf_counter()
+    python_code = None
+    if not notebook_use_nbconvert:
+        notebook = json.loads(notebook_content)
+        # Older notebook formats keep cells under worksheets; leave those to nbconvert's upgrade path
+        if notebook.get("nbformat", 0) >= 4:
+            python_code = extract_notebook(notebook)
+    if python_code is None:
+        python_code = convert_ipynb_nbconvert(notebook_content)
+    run_stats.add("convert", time.perf_counter() - start, len(notebook_content), len(python_code), file=file)
+    return python_code
+
+def convert_ipynb_nbconvert(notebook_content):
+    import nbformat
+    from nbconvert import PythonExporter
+
     exporter = PythonExporter()
     python_code, _ = exporter.from_notebook_node(
         nbformat.reads(notebook_content, as_version=4)
     )
     return python_code
 
+# Reproduces PythonExporter's layout straight from the notebook JSON, without nbformat validation or Jinja
+def extract_notebook(notebook):
+    parts = ["#!/usr/bin/env python\n# coding: utf-8\n"]
+    for cell in notebook.get("cells", []):
+        if cell.get("transient", {}).get("remove_source"):
+            continue
+        source = cell_source(cell.get("source", ""))
+        cell_type = cell.get("cell_type")
+        if cell_type == "code":
+            execution_count = cell.get("execution_count") if notebook_execution_counts else None
+            parts.append(f"\n# In[{execution_count or ' '}]:\n\n\n")
+            parts.append(notebook_code_to_python(source))
+            parts.append("\n")
+            if notebook_include_outputs:
+                parts.extend(notebook_cell_outputs(cell, execution_count))
+        elif cell_type == "markdown":
+            if notebook_drop_images:
+                source = notebook_data_uri_pattern.sub(r"(embedded \1 omitted)", source)
+            parts.append("\n" + comment_lines(source) + "\n")
+        elif cell_type == "raw":
+            if cell.get("metadata", {}).get("raw_mimetype", "").lower() in ("text/x-python", ""):
+                parts.append(source)
+    return "".join(parts)
+
+def cell_source(source):
+    return source if isinstance(source, str) else "".join(source)
+
+def comment_lines(text, prefix="# "):
+    return prefix + ("\n" + prefix).join(text.split("\n"))
+
+notebook_data_uri_pattern = re.compile(r"data:(image/[\w.+-]+);base64,[A-Za-z0-9+/=]+")
+# Lines IPython's input transformer could rewrite: magics, shell escapes, help queries, pasted prompts
+ipython_syntax_pattern = re.compile(r"^\s*(?:[%!?,;/]|>>>|\.\.\.|In \[\d*\]:)|=\s*[%!]|\?\s*$", re.M)
+
+def notebook_code_to_python(source):
+    if not source:
+        return "\n"
+    if source[0].isspace() or ipython_syntax_pattern.search(source):
+        try:
+            from IPython.core.inputtransformer2 import TransformerManager
+        except ImportError:
+            pass
+        else:
+            return TransformerManager().transform_cell(source)
+    return source if source.endswith("\n") else source + "\n"
+
+def notebook_cell_outputs(cell, execution_count):
+    parts = []
+    for output in cell.get("outputs", []):
+        output_type = output.get("output_type")
+        if output_type == "stream":
+            text = cell_source(output.get("text", ""))
+        elif output_type == "error":
+            text = "\n".join(output.get("traceback", []))
+        else:
+            data = output.get("data", {})
+            images = [mime for mime in data if mime.startswith("image/") and mime != "image/svg+xml"]
+            if "text/plain" in data:
+                text = cell_source(data["text/plain"])
+            elif images and not notebook_drop_images:
+                text = cell_source(data[images[0]])
+            else:
+                continue
+        if output_type == "execute_result":
+            parts.append(f"\n# Out[{execution_count or ' '}]:\n")
+        parts.append("\n" + comment_lines(text.rstrip("\n")) + "\n")
+    return parts
+
 def process_github_repo_directory(url, output):
     headers = github_auth_headers()
     response = requests.get(url, headers=headers)
@@ -152,92 +502,511 @@ def process_github_repo_directory(url, output):
         elif file["type"] == "dir":
             process_github_repo_directory(file["url"], output)
 
-def process_local_dir_files(root, files, output):
-    for file in files:
-        file_path = os.path.join(root, file)
-        if is_allowed_filetype(file_path):
-            console.print(f"Processing: {file_path}", style="bold blue")
+def admit_local_files(paths):
+    # (path, size) for the files that pass the size and name checks; the rest are skipped unread
+    for path in paths:
+        size = os.path.getsize(path)
+        reason = skip_reason_before_read(path, size)
+        if reason:
+            skip_file(path, size, reason)
+        else:
+            yield path, size
 
-            output.write(f"#{'#' * 10}\n")
-            output.write(f"# FILE - {file_path}:\n")
-            output.write(f"#{'#' * 10}\n\n")
+def render_local_file(file_path):
+    # None for files the content checks leave out
+    data = read_local_file(file_path)
+    try:
+        text = render_local_chunk(file_path, data)
+        return (text, len(data), None) if text is not None else None
+    finally:
+        release_file_data(data)
+
+def read_local_file(file_path):
+    # Raw bytes, read once; large files are memory-mapped rather than copied
+    start = time.perf_counter()
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size >= ingest_mmap_min_bytes:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            data = f.read()
+    run_stats.add("fetch", time.perf_counter() - start, len(data), file=file_path)
+    return data
 
-            if file_path.endswith(".ipynb"):
-                output.write(process_ipynb_file(file_path))
-            else:
-                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                    output.write(f.read())
-            output.write("\n")
+def release_file_data(data):
+    if isinstance(data, mmap.mmap):
+        data.close()
 
-def process_local_directory(local_path, output):
-    root_dir = local_path
+def render_local_chunk(file_path, data):
+    content = ingest_text(file_path, data)
+    if content is None:
+        return None
+    if file_path.endswith(".ipynb"):
+        content = convert_ipynb(content, file=file_path)
+
+    header = f"#{'#' * 10}\n# FILE - {file_path}:\n#{'#' * 10}\n\n"
+    return f"{header}{content}\n"
+
+def ingest_text(path, data):
+    # Decoded text of a file's bytes after the content checks, or None when it is skipped. Binary files
+    # never get decoded; minified / generated files are skipped or cut down to ingest_truncate_bytes
+    head = bytes(data[:ingest_sniff_bytes])
+    kind = sniff_file(path, head)
+    if kind == "binary":
+        skip_file(path, len(data), "binary")
+        return None
 
-    for root, dirs, files in os.walk(local_path):
-        if root == root_dir:
-            process_local_dir_files(root, files, output)
+    generated = kind == "minified" or bool(generated_file_pattern and generated_file_pattern.search(path.replace(os.sep, "/")))
+    if generated and ingest_generated_policy == "skip":
+        skip_file(path, len(data), kind or "generated")
+        return None
+    if generated and ingest_generated_policy == "truncate" and len(data) > ingest_truncate_bytes:
+        cut = data.rfind(b"\n", 0, ingest_truncate_bytes) + 1 or ingest_truncate_bytes
+        run_stats.skip("truncated", len(data) - cut, file=path)
+        text = decode_text(data[:cut], file=path)
+        return f"{text}\n... [truncated: first {cut} of {len(data)} bytes of a {kind or 'generated'} file]\n"
+    return decode_text(data, file=path)
+
+def local_render_settings():
+    # Hash of the flags that change how a local file is rendered; chunks rendered under other settings are stale
+    settings = [
+        notebook_use_nbconvert, notebook_include_outputs, notebook_execution_counts, notebook_drop_images,
+        ingest_sniff_bytes, ingest_max_line_length, minified_file_extensions, ingest_generated_policy, ingest_truncate_bytes,
+        generated_file_patterns,
+    ]
+    return hashlib.sha256(json.dumps(settings).encode("utf-8")).hexdigest()[:16]
+
+class LocalManifest:
+    # Remembers size, mtime, content hash, rendered chunk and token count of every local file, so unchanged
+    # files are spliced back in on the next run without being read, converted or tokenized again. A manifest
+    # written under different rendering settings is not reused
+    def __init__(self, manifest_file, local_path):
+        self.manifest_file = manifest_file
+        self.chunk_dir = os.path.join(os.path.dirname(manifest_file), "local_chunks")
+        self.local_path = os.path.abspath(local_path)
+        self.settings = local_render_settings()
+        self.previous = {}
+        self.current = {}
+        self.reused = 0
+        self.rendered = 0
+        self.lock = threading.Lock()
+
+        try:
+            with open(manifest_file, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("root") == self.local_path and manifest.get("settings") == self.settings:
+                self.previous = manifest["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def render(self, file_path):
+        stat = os.stat(file_path)
+        entry = self.previous.get(file_path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            text = self.read_chunk(entry)
+            if text is not None:
+                return self.keep(file_path, entry, text, reused=True)
+
+        data = read_local_file(file_path)
+        try:
+            digest = hashlib.sha256(data).hexdigest()
+
+            # Touched but unchanged files only cost a read and a hash
+            if entry and entry["sha256"] == digest:
+                text = self.read_chunk(entry)
+                if text is not None:
+                    entry = dict(entry, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                    return self.keep(file_path, entry, text, reused=True)
+
+            text = render_local_chunk(file_path, data)
+        finally:
+            release_file_data(data)
+        if text is None:
+            return None
+        chunk = hashlib.sha256(f"{file_path}\0{digest}\0{self.settings}".encode("utf-8")).hexdigest()
+        write_cache_file(os.path.join(self.chunk_dir, chunk), text.encode("utf-8"))
+        entry = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": digest,
+            "chunk": chunk,
+            "tokens": get_token_count(text),
+        }
+        return self.keep(file_path, entry, text, reused=False)
+
+    def read_chunk(self, entry):
+        try:
+            with open(os.path.join(self.chunk_dir, entry["chunk"]), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def keep(self, file_path, entry, text, reused):
+        with self.lock:
+            self.current[file_path] = entry
+            if reused:
+                self.reused += 1
+            else:
+                self.rendered += 1
+        return text, entry["size"], entry["tokens"]
+
+    def save(self):
+        manifest = {"root": self.local_path, "settings": self.settings, "files": self.current}
+        write_cache_file(self.manifest_file, json.dumps(manifest).encode("utf-8"))
+
+        # Drop chunks of files that were deleted or changed since the previous run
+        live_chunks = {entry["chunk"] for entry in self.current.values()}
+        for name in os.listdir(self.chunk_dir) if os.path.isdir(self.chunk_dir) else []:
+            if name not in live_chunks:
+                os.remove(os.path.join(self.chunk_dir, name))
+
+def walk_local_directory(local_path):
+    # Visit every directory once, depth-first in name order; excluded and ignored subtrees are pruned before
+    # descending, so nothing below them is listed or stat'ed
+    root_rules = load_ignore_rules(local_path, "") if use_ignore_files else []
+    stack = [(local_path, "", root_rules)]
+    while stack:
+        dir_path, rel_dir, rules = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            console.print(f"Skipping unreadable path: {dir_path} ({e})", style="bold red")
+            continue
+
+        if rel_dir and use_ignore_files and any(entry.name in ignore_file_names for entry in entries):
+            rules = rules + load_ignore_rules(dir_path, rel_dir)
+
+        subdirs = []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if should_exclude(entry.path):
+                    console.print(f"Excluding path: {entry.path}", style="bold red")
+                elif rules and is_ignored(rules, rel_path, is_dir=True):
+                    console.print(f"Ignoring path: {entry.path}", style="bold red")
+                else:
+                    subdirs.append((entry.path, rel_path, rules))
+            elif rules and is_ignored(rules, rel_path, is_dir=False):
+                continue
+            elif is_allowed_filetype(entry.path) and entry.is_file():
+                yield entry.path
+
+        stack.extend(reversed(subdirs))
+
+def ordered_results(executor, fn, items, window):
+    # Runs fn over items with at most `window` calls in flight, yielding (item, result) in input order
+    pending = deque()
+    for item in items:
+        pending.append((item, executor.submit(fn, item)))
+        if len(pending) >= window:
+            item, future = pending.popleft()
+            yield item, future.result()
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
+
+def process_local_directory(local_path, output, manifest_file=None):
+    start_time = time.perf_counter()
+    file_count = 0
+    byte_count = 0
+    manifest = LocalManifest(manifest_file, local_path) if manifest_file else None
+    render = manifest.render if manifest else render_local_file
+    packer = TokenPacker(pack_max_tokens) if pack_max_tokens else None
+
+    def render_counted(file_path):
+        rendered = render(file_path)
+        if rendered is None:
+            return None, 0
+        text, size, tokens = rendered
+        if tokens is None:
+            tokens = get_token_count(text)
+        return (text, size, tokens), tokens
+
+    with ContextThreadPool(max_workers=local_read_workers) as executor:
+        files = admit_local_files(walk_local_directory(local_path))
+        if packer:
+            candidates = [(os.path.relpath(path, local_path), size, path) for path, size in files]
+            rendered = packer.pack(executor, candidates, render_counted, local_read_workers * 2)
         else:
-            if should_exclude(root):
-                console.print(f"Excluding path: {root}", style="bold red")
-                dirs[:] = [] # Clear the dirs list to skip processing subdirectories
+            rendered = ordered_results(executor, render, (path for path, _ in files), local_read_workers * 4)
+        for file_path, result in rendered:
+            if result is None:
                 continue
+            text, size, tokens = result
+            console.print(f"Processing: {file_path}", style="bold blue")
+            mark_section(output, file_path)
+            if tokens is None:
+                output.write(text)
             else:
-                console.print(f"Including path: {root}", style="bold green")
-                process_local_dir_files(root, files, output)
-                for dir in dirs:
-                    dir_path = os.path.join(root, dir)
-                    if should_exclude(dir_path):
-                        console.print(f"Excluding sub-path: '{dir_path}'", style="bold red")
-                        dirs.remove(dir) # Remove the directory to skip processing its contents
-                    else:
-                        process_local_dir_files(dir_path, os.listdir(dir_path), output)
-
-def process_github_repo(repo_url):
-    headers = github_auth_headers()
-    api_base_url = "https://api.github.com/repos/"
+                write_counted(output, text, tokens)
+            file_count += 1
+            byte_count += size
+
+    if packer:
+        packer.write_trailer(output)
+    elapsed = max(time.perf_counter() - start_time, 1e-9)
+    megabytes = byte_count / (1024 * 1024)
+    console.print(
+        f"\nRead {file_count} files ({megabytes:.2f} MB) in {elapsed:.2f}s: "
+        f"{file_count / elapsed:.1f} files/s, {megabytes / elapsed:.2f} MB/s",
+        style="bold green",
+    )
+
+    if manifest:
+        manifest.save()
+        console.print(
+            f"Incremental: {manifest.reused} unchanged files reused, {manifest.rendered} files rendered",
+            style="bold green",
+        )
+
+def parse_github_repo_url(repo_url):
     repo_url_parts = repo_url.split("https://github.com/")[-1].split("/")
     repo_name = "/".join(repo_url_parts[:2])
 
+    ref = ""
     subdirectory = ""
+    if len(repo_url_parts) > 3 and repo_url_parts[2] == "tree":
+        ref = repo_url_parts[3]
     if len(repo_url_parts) > 4 and repo_url_parts[2] == "tree":
-        subdirectory = "/".join(repo_url_parts[4:])
+        subdirectory = "/".join(repo_url_parts[4:]).strip("/")
+    return repo_name, ref, subdirectory
+
+def process_github_repo(repo_url, output=None):
+    # Streams into `output` when given, otherwise returns the repository content as a string
+    if output is None:
+        buffer = io.StringIO()
+        process_github_repo(repo_url, buffer)
+        return buffer.getvalue()
+
+    # A token budget needs per-file fetches to stop early, so it replaces the archive with the tree listing
+    if github_fetch_mode == "trees" or (pack_max_tokens and github_fetch_mode == "archive"):
+        process_github_repo_trees(repo_url, output)
+    elif github_fetch_mode == "archive":
+        process_github_repo_archive(repo_url, output)
+    else:
+        process_github_repo_contents(repo_url, output)
+
+    console.print("\nAll files processed.\n", style="bold green")
+
+def process_github_repo_archive(repo_url, output):
+    # Downloads the whole ref as one tarball and filters its members in memory. The tarball goes through the
+    # HTTP cache, so an unchanged repository is revalidated instead of downloaded again, and --offline reuses it
+    headers = github_auth_headers()
+    repo_name, ref, subdirectory = parse_github_repo_url(repo_url)
+    archive_url = f"{github_api_url}/repos/{repo_name}/tarball/{ref}".rstrip("/")
+
+    response = cached_get(archive_url, "github", headers=headers, timeout=github_timeout)
+    response.raise_for_status()
+
+    packer = TokenPacker(pack_max_tokens) if pack_max_tokens else None
+    candidates = []
+    written_files = 0
+    with tarfile.open(fileobj=io.BytesIO(response.content), mode="r|gz") as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+
+            # Members are prefixed with an "<owner>-<repo>-<sha>/" directory
+            path = member.name.split("/", 1)[-1]
+            if subdirectory and not path.startswith(subdirectory + "/"):
+                continue
+            dir_name, _, file_name = path.rpartition("/")
+            if dir_name and should_exclude(dir_name):
+                continue
+            if not is_allowed_filetype(file_name):
+                continue
+            reason = skip_reason_before_read(path, member.size)
+            if reason:
+                skip_file(path, member.size, reason)
+                continue
+
+            start = time.perf_counter()
+            data = archive.extractfile(member).read()
+            run_stats.add("fetch", time.perf_counter() - start, len(data), file=path)
+            if packer:
+                # The tarball arrives whole anyway; packing still saves decoding and tokenizing what is left out
+                candidates.append((path, len(data), (path, data)))
+                continue
+
+            content = render_github_file(path, data)
+            if content is None:
+                continue
+            console.print(f"Processing {path}...", style="bold blue")
+            write_github_file_block(output, path, content, first=written_files == 0)
+            written_files += 1
+
+    if packer:
+        def render_counted(candidate):
+            path, data = candidate
+            content = render_github_file(path, data)
+            return content, github_file_block_tokens(path, content) if content is not None else 0
+
+        with ContextThreadPool(max_workers=github_workers) as executor:
+            for (path, _), content in packer.pack(executor, candidates, render_counted, github_workers * 2):
+                console.print(f"Processing {path}...", style="bold blue")
+                write_github_file_block(output, path, content, first=written_files == 0)
+                written_files += 1
+        packer.write_trailer(output)
+
+def process_github_repo_trees(repo_url, output):
+    # Lists the whole tree in one call, then fetches only the allowed blobs, reusing blobs cached by SHA
+    repo_name, ref, subdirectory = parse_github_repo_url(repo_url)
+    api_base_url = f"{github_api_url}/repos/{repo_name}"
+    if not ref:
+        ref = cached_get(api_base_url, "github", headers=github_auth_headers()).json()["default_branch"]
+
+    tree_url = f"{api_base_url}/git/trees/{ref}?recursive=1"
+    tree = cached_get(tree_url, "github", headers=github_auth_headers()).json()
+    if tree.get("truncated"):
+        console.print("Tree listing is truncated; falling back to the archive download.", style="bold yellow")
+        process_github_repo_archive(repo_url, output)
+        return
+
+    blobs = []
+    for entry in tree["tree"]:
+        if entry["type"] != "blob":
+            continue
+        path = entry["path"]
+        if subdirectory and not path.startswith(subdirectory + "/"):
+            continue
+        dir_name, _, file_name = path.rpartition("/")
+        if dir_name and should_exclude(dir_name):
+            continue
+        if not is_allowed_filetype(file_name):
+            continue
+        # Tree entries carry blob sizes, so oversized and generated files are never fetched
+        reason = skip_reason_before_read(path, entry.get("size", 0))
+        if reason:
+            skip_file(path, entry.get("size", 0), reason)
+        else:
+            blobs.append(entry)
+
+    session = get_http_session()
+    # Built once here; the workers share it instead of reloading .env for every blob
+    blob_headers = dict(github_auth_headers(), Accept="application/vnd.github.raw")
+
+    def fetch_blob(entry):
+        return fetch_github_blob(session, api_base_url, blob_headers, entry["sha"])
+
+    write_github_files(output, [(entry["path"], entry.get("size", 0), entry) for entry in blobs], fetch_blob)
+
+def write_github_files(output, files, fetch):
+    # files are (path, size, item) in listing order; fetch(item) returns the file's bytes and runs on the
+    # worker threads along with decoding. Listings carry file sizes, so under a token budget the files are
+    # ranked before anything is fetched
+    packer = TokenPacker(pack_max_tokens) if pack_max_tokens else None
+
+    def render(file):
+        path, _, item = file
+        return render_github_file(path, fetch(item))
+
+    def render_counted(file):
+        content = render(file)
+        return content, github_file_block_tokens(file[0], content) if content is not None else 0
+
+    written_files = 0
+    with ContextThreadPool(max_workers=github_workers) as executor:
+        if packer:
+            candidates = [(path, size, (path, size, item)) for path, size, item in files]
+            rendered = packer.pack(executor, candidates, render_counted, github_workers * 2)
+        else:
+            rendered = ordered_results(executor, render, files, github_workers * 4)
+        for (path, _, _), content in rendered:
+            if content is None:
+                continue
+            console.print(f"Processing {path}...", style="bold blue")
+            write_github_file_block(output, path, content, first=written_files == 0)
+            written_files += 1
+    if packer:
+        packer.write_trailer(output)
+
+def fetch_github_blob(session, api_base_url, headers, sha):
+    blob_path = os.path.join(cache_dir, "blobs", sha[:2], sha)
+    if os.path.exists(blob_path):
+        run_stats.cache_hit("fresh")
+        with open(blob_path, "rb") as f:
+            return f.read()
+    blob_url = f"{api_base_url}/git/blobs/{sha}"
+    if offline_mode:
+        raise requests.exceptions.ConnectionError(f"{blob_url} is not in the HTTP cache (offline mode)")
+
+    start = time.perf_counter()
+    response = session.get(blob_url, headers=headers, timeout=github_timeout)
+    run_stats.request(time.perf_counter() - start, response.status_code, len(response.content))
+    run_stats.add("fetch", time.perf_counter() - start, len(response.content))
+    response.raise_for_status()
+    write_cache_file(blob_path, response.content)
+    return response.content
+
+def write_cache_file(path, data):
+    # Write-then-rename so concurrent runs never see a partial cache entry
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def decode_text(data, file=None):
+    # Same newline translation as reading the bytes from a file in text mode; see decode_bytes for the encoding
+    start = time.perf_counter()
+    text = decode_bytes(data)
+    run_stats.add("decode", time.perf_counter() - start, len(data), len(text), file=file)
+    return text
+
+def process_github_repo_contents(repo_url, output):
+    # Lists the repository one directory per API call, then downloads the allowed files into memory
+    headers = github_auth_headers()
+    api_base_url = f"{github_api_url}/repos/"
+    repo_name, _, subdirectory = parse_github_repo_url(repo_url)
 
     contents_url = f"{api_base_url}{repo_name}/contents"
     if subdirectory:
         contents_url = f"{contents_url}/{subdirectory}"
 
-    repo_content = []
+    files = []
 
-    def process_github_repo_directory(url, repo_content):
-        response = requests.get(url, headers=headers)
+    def list_github_directory(url):
+        response = cached_get(url, "github", headers=headers, timeout=github_timeout)
         response.raise_for_status()
-        files = response.json()
-
-        for file in files:
+        for file in response.json():
             if file["type"] == "file" and is_allowed_filetype(file["name"]):
-                console.print(f"Processing {file['path']}...", style="bold blue")
+                reason = skip_reason_before_read(file["path"], file.get("size", 0))
+                if reason:
+                    skip_file(file["path"], file.get("size", 0), reason)
+                else:
+                    files.append((file["path"], file.get("size", 0), file["download_url"]))
+            elif file["type"] == "dir" and not should_exclude(file["path"]):
+                list_github_directory(file["url"])
 
-                temp_file = f"temp_{file['name']}"
-                download_file(file["download_url"], temp_file)
+    def fetch_file(download_url):
+        response = cached_get(download_url, "raw", headers=headers, timeout=github_timeout)
+        response.raise_for_status()
+        return response.content
 
-                repo_content.append(f"# {'-' * 3}\n")
-                repo_content.append(f"# Filename: {file['path']}\n")
-                repo_content.append(f"# {'-' * 3}\n\n")
+    list_github_directory(contents_url)
+    write_github_files(output, files, fetch_file)
 
-                if file["name"].endswith(".ipynb"):
-                    repo_content.append(process_ipynb_file(temp_file))
-                else:
-                    with open(temp_file, "r", encoding="utf-8", errors="ignore") as f:
-                        repo_content.append(f.read())
+def render_github_file(path, data):
+    content = ingest_text(path, data)
+    if content is not None and path.endswith(".ipynb"):
+        content = convert_ipynb(content, file=path)
+    return content
 
-                repo_content.append("\n\n")
-                os.remove(temp_file)
-            elif file["type"] == "dir":
-                process_github_repo_directory(file["url"], repo_content)
+def github_file_block_header(path):
+    return f"# {'-' * 3}\n\n# Filename: {path}\n\n# {'-' * 3}\n\n\n"
 
-    process_github_repo_directory(contents_url, repo_content)
+def github_file_block_tokens(path, content):
+    # Budget estimate for one block, charged with the separator after it and the newline before the next one
+    return get_token_count(github_file_block_header(path)) + get_token_count(content + "\n\n\n\n")
 
-    console.print("\nAll files processed.\n", style="bold green")
-    return "\n".join(repo_content)
+def write_github_file_block(output, path, content, first=False):
+    # Same bytes the original newline-joined list of header/content pieces produced
+    if not first:
+        output.write("\n")
+    mark_section(output, path)
+    output.write(github_file_block_header(path))
+    output.write(content)
+    output.write("\n\n\n")
 
 def process_local_folder(local_path, output_file):
     with open(output_file, "w", encoding="utf-8") as output:
@@ -246,21 +1015,13 @@ def process_local_folder(local_path, output_file):
     console.print("\nAll files processed.\n", style="bold green")
 
 def process_arxiv_pdf(arxiv_abs_url, output_file):
-    pdf_url = arxiv_abs_url.replace("/abs/", "/pdf/") + ".pdf"
-    response = requests.get(pdf_url)
-    pdf_content = response.content
-
-    with open("temp.pdf", "wb") as pdf_file:
-        pdf_file.write(pdf_content)
-
-    text = []
-    with open("temp.pdf", "rb") as pdf_file:
-        pdf_reader = PdfReader(pdf_file)
-        for page in range(len(pdf_reader.pages)):
-            text.append(pdf_reader.pages[page].extract_text())
-
     with open(output_file, "w", encoding="utf-8") as output:
-        output.write(" ".join(text))
+        write_arxiv_pdf(arxiv_abs_url, output)
+
+def write_arxiv_pdf(arxiv_abs_url, output):
+    pdf_url = arxiv_abs_url.replace("/abs/", "/pdf/") + ".pdf"
+    response = cached_get(pdf_url, "pdf")
+    write_pdf_text(response.content, output, separator=" ")
 
     console.print("\nAll files processed.\n", style="bold green")
 
@@ -278,6 +1039,9 @@ def extract_links(input_file, output_file):
             output.write(url + "\n")
 
 def fetch_youtube_transcript(url):
+    from youtube_transcript_api import YouTubeTranscriptApi
+    from youtube_transcript_api.formatters import TextFormatter
+
     def extract_video_id(url):
         pattern = r"(?:https?:\/\/)?(?:www\.)?(?:youtube\.com\/(?:[^\/\n\s]+\/\S+\/|(?:v|e(?:mbed)?)\/|\S*?[?&]v=)|youtu\.be\/)([a-zA-Z0-9_-]{11})"
         match = re.search(pattern, url)
@@ -298,26 +1062,519 @@ def fetch_youtube_transcript(url):
         return f"Error: {str(e)}"
 
 def preprocess_text(input_file, output_file):
-    with open(input_file, "r", encoding="utf-8") as input_file:
-        input_text = input_file.read()
+    # Streams the file through TextCompressor chunk by chunk; the result is byte-identical to compressing it in one go
+    compressor = TextCompressor(output_file)
+    with open(input_file, "r", encoding="utf-8") as source:
+        for chunk in iter(functools.partial(source.read, compress_chunk_size), ""):
+            compressor.feed(chunk)
+    compressor.close()
 
-    text = re.sub(r"[\n\r]+", "\n", input_text)
-    text = re.sub(r"[^a-zA-Z0-9\s_.,!?:;@#$%^&*()+\-=[\]{}|\\<>`~'\"/]+", "", text)
-    text = re.sub(r"\s+", " ", text)
-    text = text.lower()
+@functools.lru_cache(maxsize=None)
+def get_encoder():
+    import tiktoken
 
-    words = text.split()
-    words = [word for word in words if word not in stop_words]
-    text = " ".join(words)
-
-    with open(output_file, "w", encoding="utf-8") as output_file:
-        output_file.write(text.strip())
+    return tiktoken.get_encoding("cl100k_base")
 
 def get_token_count(text):
-    enc = tiktoken.get_encoding("cl100k_base")
-    disallowed_special = enc.special_tokens_set - {""}
-    tokens = enc.encode(text, disallowed_special=disallowed_special)
-    return len(tokens)
+    # Special-token text such as "<|endoftext|>" is counted as ordinary text instead of raising
+    return len(get_encoder().encode_ordinary(text))
+
+def count_tokens_batch(texts):
+    if len(texts) == 1:
+        return [get_token_count(texts[0])]
+    tokens = get_encoder().encode_ordinary_batch(texts, num_threads=token_count_threads)
+    return [len(chunk) for chunk in tokens]
+
+def write_counted(output, text, tokens):
+    # Writes text whose token count is already known, so token counters can skip encoding it
+    write = getattr(output, "write_counted", None)
+    if write:
+        write(text, tokens)
+    else:
+        output.write(text)
+
+def mark_section(output, label):
+    # Tells token-aware outputs which file or URL the following writes belong to
+    begin_section = getattr(output, "begin_section", None)
+    if begin_section:
+        begin_section(label)
+
+def pack_priority(path):
+    path = path.replace(os.sep, "/").lower()
+    for pattern, rank in pack_priorities:
+        if re.search(pattern, path):
+            return rank
+    return pack_default_priority
+
+class TokenPacker:
+    # Greedy packing of files into a token budget. Candidates are ranked by pack_priority and size, then
+    # rendered and counted in that order and kept while they fit; once the budget is full, or for files at
+    # least as large as one that already overflowed, candidates are left out without being fetched or read.
+    # The trailer listing what was left out is part of the budget: its largest possible size is reserved up front,
+    # and under a small budget it names fewer files, or is left out when not even its summary line fits
+    def __init__(self, max_tokens):
+        self.max_tokens = max_tokens
+        self.budget = max_tokens
+        self.listed = pack_trailer_files  # omitted files the trailer names, or None for no trailer
+        self.used = 0
+        self.packed = 0
+        self.omitted = []
+        self.overflow_size = None
+
+    def pack(self, executor, candidates, load, window):
+        # candidates are (path, size, item); load(item) returns (result, tokens) and runs on the executor.
+        # Yields (item, result) for the files that fit, in ranked order
+        ranked = sorted(candidates, key=lambda candidate: (pack_priority(candidate[0]), candidate[1], candidate[0]))
+        self.budget = self.max_tokens - self.trailer_reserve(ranked)
+
+        def load_if_room(candidate):
+            # Candidates are submitted a window ahead of the budget being charged, so the check is repeated
+            # once a worker picks the file up; by then the files before it have usually been counted
+            path, size, item = candidate
+            if not self.has_room(size):
+                return None, None
+            return load(item)
+
+        wanted = (candidate for candidate in ranked if self.should_load(candidate[0], candidate[1]))
+        for (path, size, item), (result, tokens) in ordered_results(executor, load_if_room, wanted, window):
+            if tokens is None:
+                self.omitted.append((path, size, None))
+            # Files the ingestion checks leave out load as None and cost nothing
+            elif result is not None and self.fits(path, size, tokens):
+                yield item, result
+
+    def has_room(self, size):
+        return self.used < self.budget and (self.overflow_size is None or size < self.overflow_size)
+
+    def should_load(self, path, size):
+        if not self.has_room(size):
+            self.omitted.append((path, size, None))
+            return False
+        return True
+
+    def fits(self, path, size, tokens):
+        if self.used + tokens > self.budget:
+            self.omitted.append((path, size, tokens))
+            self.overflow_size = size if self.overflow_size is None else min(self.overflow_size, size)
+            return False
+        self.used += tokens
+        self.packed += 1
+        return True
+
+    def write_trailer(self, output):
+        console.print(
+            f"Packed {self.packed} files ({self.used} of {self.max_tokens} tokens); left out {len(self.omitted)}",
+            style="bold green",
+        )
+        if not self.omitted:
+            return
+        if self.listed is None:
+            console.print(f"No room for the list of omitted files in {self.max_tokens} tokens", style="bold yellow")
+            return
+        mark_section(output, "<token budget trailer>")
+        output.write(self.trailer_text(self.packed, self.used, self.omitted))
+
+    def trailer_text(self, packed, used, omitted):
+        listed = omitted[:self.listed]
+        lines = [
+            f"\n# Token budget: packed {packed} files ({used} of {self.max_tokens} tokens); "
+            f"left out {len(omitted)} files, {len(listed)} listed:\n"
+        ]
+        for path, size, tokens in listed:
+            lines.append(f"# - {path} ({size} bytes, {'not read' if tokens is None else f'{tokens} tokens'})\n")
+        if len(omitted) > len(listed):
+            lines.append(f"# ... and {len(omitted) - len(listed)} more\n")
+        return "".join(lines)
+
+    def trailer_reserve(self, ranked):
+        # Worst case: every count at its widest and the longest paths listed, with a token per byte. Picks the
+        # longest listing whose worst case fits the budget
+        if not ranked:
+            return 0
+        longest = sorted(ranked, key=lambda candidate: len(candidate[0]), reverse=True)[:pack_trailer_files]
+        for listed in range(len(longest), -1, -1):
+            self.listed = listed
+            omitted = [(path, size, size) for path, size, _ in longest[:listed]] + [("", 0, None)] * (len(ranked) - listed)
+            reserve = get_token_count(self.trailer_text(len(ranked), self.max_tokens, omitted))
+            if reserve <= self.max_tokens:
+                return reserve
+        self.listed = None
+        return 0
+
+token_boundary_pattern = re.compile(r"(?<=\S) |(?<=\n)(?=\S)")
+
+class RunStats:
+    # Wall time, bytes and call counts per source handler and stage (fetch, decode, convert, write, compress,
+    # count), plus HTTP request counts, latencies and cache outcomes; updated from worker threads
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.handler = "main"
+        self.local = threading.local()
+        self.thread_tables = []  # (stages, files) of every thread that called add()
+        self.http = {}
+        self.http_cache = {"fresh": 0, "revalidated": 0, "downloaded": 0}  # outcomes of cached_get
+        self.files = {}
+        self.skipped = {}
+        self.ingested_bytes = 0  # admitted so far, for ingest_max_total_bytes
+
+    def add(self, stage, seconds, bytes_in=0, bytes_out=0, file=None):
+        # Called for every chunk written, read or counted, so it takes no lock: each thread adds to its own
+        # tables, and to_dict merges them once the work is done
+        tables = getattr(self.local, "tables", None)
+        if tables is None:
+            tables = self.local.tables = ({}, {})
+            with self.lock:
+                self.thread_tables.append(tables)
+        stages, files = tables
+        handler_stages = stages.get(self.handler)
+        if handler_stages is None:
+            handler_stages = stages[self.handler] = {}
+        entry = handler_stages.get(stage)
+        if entry is None:
+            entry = handler_stages[stage] = {"calls": 0, "seconds": 0.0, "bytes_in": 0, "bytes_out": 0}
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+        entry["bytes_in"] += bytes_in
+        entry["bytes_out"] += bytes_out
+        if file is not None and stats_per_file:
+            file_entry = files.setdefault(file, {"bytes_in": 0, "bytes_out": 0})
+            file_entry[f"{stage}_s"] = file_entry.get(f"{stage}_s", 0.0) + seconds
+            if stage == "fetch":
+                file_entry["bytes_in"] += bytes_in
+            elif stage == "write":
+                file_entry["bytes_out"] += bytes_out
+
+    def merged_tables(self):
+        # Stage and per-file tables of all threads combined; skip reasons recorded per file are kept as they are
+        stages, files = {}, {}
+        for thread_stages, thread_files in self.thread_tables:
+            for handler, entries in thread_stages.items():
+                handler_stages = stages.setdefault(handler, {})
+                for stage, entry in entries.items():
+                    total = handler_stages.setdefault(stage, dict.fromkeys(entry, 0))
+                    for key, value in entry.items():
+                        total[key] += value
+            for file, entry in thread_files.items():
+                total = files.setdefault(file, {})
+                for key, value in entry.items():
+                    total[key] = total.get(key, 0) + value
+        for file, entry in self.files.items():
+            total = files.setdefault(file, {})
+            for key, value in entry.items():
+                total[key] = value if isinstance(value, str) else total.get(key, 0) + value
+        return stages, files
+
+    def request(self, seconds, status, size, cache="uncached"):
+        # cache is "fresh" (served without a request), "revalidated", "downloaded" or "uncached"
+        with self.lock:
+            http = self.http.get(self.handler)
+            if http is None:
+                http = self.http[self.handler] = {"requests": 0, "bytes": 0, "latencies": [], "status": {}, "cache": {}}
+            http["cache"][cache] = http["cache"].get(cache, 0) + 1
+            if cache != "fresh":
+                http["requests"] += 1
+                http["bytes"] += size
+                http["latencies"].append(seconds)
+                http["status"][str(status)] = http["status"].get(str(status), 0) + 1
+
+    def cache_hit(self, cache):
+        self.request(0.0, None, 0, cache)
+
+    def http_cache_outcome(self, kind):
+        with self.lock:
+            self.http_cache[kind] += 1
+
+    def skip(self, reason, size, file=None):
+        # Files left out (or cut short, "truncated") by the ingestion checks; size is the bytes not ingested
+        with self.lock:
+            entry = self.skipped.setdefault(reason, {"files": 0, "bytes": 0})
+            entry["files"] += 1
+            entry["bytes"] += size
+            if file is not None and stats_per_file:
+                self.files.setdefault(file, {"bytes_in": 0, "bytes_out": 0})["skipped"] = reason
+
+    def to_dict(self):
+        with self.lock:
+            merged_stages, merged_files = self.merged_tables()
+            handlers = {}
+            for handler in {**merged_stages, **self.http}:
+                stages = {
+                    stage: dict(entry, seconds=round(entry["seconds"], 4))
+                    for stage, entry in merged_stages.get(handler, {}).items()
+                }
+                handlers[handler] = {"stages": stages}
+                http = self.http.get(handler)
+                if http:
+                    latencies = sorted(http["latencies"])
+                    handlers[handler]["http"] = {
+                        "requests": http["requests"],
+                        "bytes": http["bytes"],
+                        "status": http["status"],
+                        "cache": http["cache"],
+                        "latency_s": {
+                            "mean": round(sum(latencies) / len(latencies), 4),
+                            "p50": round(latencies[len(latencies) // 2], 4),
+                            "p95": round(latencies[int(len(latencies) * 0.95)], 4),
+                            "max": round(latencies[-1], 4),
+                        } if latencies else None,
+                    }
+            files = {
+                file: {key: round(value, 4) if isinstance(value, float) else value for key, value in entry.items()}
+                for file, entry in merged_files.items()
+            }
+            skipped = {reason: dict(entry) for reason, entry in self.skipped.items()}
+            return {"handlers": handlers, "http_cache": dict(self.http_cache), "skipped": skipped, "files": files}
+
+class CurrentRunStats:
+    # run_stats forwards to the RunStats of the run in progress, so batch inputs processed side by side keep
+    # their own numbers; ContextThreadPool carries the current run onto the worker threads a handler uses
+    def __getattr__(self, name):
+        return getattr(current_run_stats.get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(current_run_stats.get(), name, value)
+
+class ContextThreadPool(ThreadPoolExecutor):
+    # Runs every task in a copy of the submitting thread's context
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+current_run_stats = contextvars.ContextVar("current_run_stats", default=RunStats())
+run_stats = CurrentRunStats()
+
+class OutputSink:
+    # File-like writer shared by all source handlers; every chunk goes straight to disk and to the attached consumers.
+    # With a ShardWriter, the same bytes also go to the shards, along with the byte offset where each file / URL starts
+    def __init__(self, output_file, consumers=None, shards=None):
+        self.output_file = output_file
+        self.consumers = list(consumers or [])
+        self.shards = shards
+        self.bytes_written = 0
+        self.byte_offset = 0
+        self.section = None
+        self.shard_count = None
+        # Binary, so byte offsets are known without re-encoding; newlines are translated like text mode would
+        self.file = open(output_file, "wb")
+
+    def begin_section(self, label):
+        self.section = label
+        for consumer in self.consumers:
+            mark_section(consumer, label)
+        if self.shards:
+            self.shards.begin_section(label, self.byte_offset)
+
+    def write(self, text):
+        if not text:
+            return
+        self.write_file(text)
+        for consumer in self.consumers:
+            consumer.feed(text)
+
+    def write_counted(self, text, tokens):
+        if not text:
+            return
+        self.write_file(text)
+        for consumer in self.consumers:
+            if hasattr(consumer, "feed_counted"):
+                consumer.feed_counted(text, tokens)
+            else:
+                consumer.feed(text)
+
+    def write_file(self, text):
+        start = time.perf_counter()
+        data = (text if os.linesep == "\n" else text.replace("\n", os.linesep)).encode("utf-8")
+        self.file.write(data)
+        if self.shards:
+            self.shards.write(data)
+        self.byte_offset += len(data)
+        self.bytes_written += len(text)
+        run_stats.add("write", time.perf_counter() - start, bytes_out=len(text), file=self.section)
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.close()
+        for consumer in self.consumers:
+            consumer.close()
+        if self.shards:
+            self.shard_count = self.shards.close(self.byte_offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class TokenCounter:
+    # Counts tokens of a text stream in bounded chunks cut at pre-token boundaries, so the total matches
+    # encoding the whole text at once; ready chunks are encoded in batches across threads
+    def __init__(self, chunk_size=None, batch_size=None):
+        self.chunk_size = chunk_size or token_chunk_size
+        self.batch_size = batch_size or token_count_threads
+        self.buffer = []
+        self.buffered = 0
+        self.ready = []
+        self.section = None
+        self.pending_section = None
+        self.total = 0
+        self.sections = {}
+        # Tokens per section occurrence, in output order: span 0 is the text before the first section, and a
+        # label that starts more than once gets a span each time
+        self.span = 0
+        self.span_tokens = [0]
+
+    def begin_section(self, label):
+        self.pending_section = label
+        self.span_tokens.append(0)
+
+    def feed(self, text):
+        if self.pending_section is not None:
+            self.switch_section(text)
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= self.chunk_size:
+            self.cut(safe_token_boundary)
+
+    def feed_counted(self, text, tokens):
+        # Used at file boundaries, which are pre-token boundaries, so buffered text can be flushed whole
+        buffered_text = "".join(self.buffer)
+        if buffered_text:
+            self.ready.append((self.section, self.span, buffered_text))
+        self.buffer = []
+        self.buffered = 0
+        self.count_ready()
+
+        if self.pending_section is not None:
+            self.section = self.pending_section
+            self.span = len(self.span_tokens) - 1
+            self.pending_section = None
+        self.total += tokens
+        self.span_tokens[self.span] += tokens
+        if self.section is not None:
+            self.sections[self.section] = self.sections.get(self.section, 0) + tokens
+
+    def switch_section(self, next_text):
+        # Cut exactly at the section start when that is a safe boundary, otherwise at the last safe
+        # boundary before it; any remainder is attributed to the new section
+        head = "".join(self.buffer)
+        if head and head[-1] == "\n" and not next_text[0].isspace():
+            self.cut(len)
+        elif head:
+            self.cut(safe_token_boundary)
+        self.section = self.pending_section
+        self.span = len(self.span_tokens) - 1
+        self.pending_section = None
+
+    def cut(self, find_boundary):
+        text = "".join(self.buffer)
+        pos = find_boundary(text)
+        if pos:
+            self.ready.append((self.section, self.span, text[:pos]))
+        self.buffer = [text[pos:]]
+        self.buffered = len(text) - pos
+        if len(self.ready) >= self.batch_size:
+            self.count_ready()
+
+    def count_ready(self):
+        if not self.ready:
+            return
+        start = time.perf_counter()
+        counts = count_tokens_batch([text for _, _, text in self.ready])
+        run_stats.add("count", time.perf_counter() - start, bytes_in=sum(len(text) for _, _, text in self.ready))
+        for (section, span, _), count in zip(self.ready, counts):
+            self.total += count
+            self.span_tokens[span] += count
+            if section is not None:
+                self.sections[section] = self.sections.get(section, 0) + count
+        self.ready = []
+
+    def close(self):
+        text = "".join(self.buffer)
+        if text:
+            self.ready.append((self.section, self.span, text))
+        self.count_ready()
+        self.buffer = []
+        self.buffered = 0
+
+    def counted_spans(self):
+        # Spans before the returned index have their final token counts
+        if self.ready:
+            return self.ready[0][1]
+        if self.buffered:
+            return self.span
+        return len(self.span_tokens)
+
+    def top_sections(self, limit=15):
+        return sorted(self.sections.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+def safe_token_boundary(text):
+    # cl100k pre-tokens never span "<non-space><space>" or "<newline><non-space>", so cutting there
+    # leaves the token count unchanged; the tail of the text is searched first
+    window = 4096
+    while True:
+        start = max(0, len(text) - window)
+        last = None
+        for last in token_boundary_pattern.finditer(text, start):
+            pass
+        if last and last.start():
+            return last.start()
+        if start == 0:
+            return 0
+        window *= 16
+
+disallowed_chars_pattern = re.compile(r"[^a-zA-Z0-9\s_.,!?:;@#$%^&*()+\-=[\]{}|\\<>`~'\"/]+")
+ascii_disallowed_chars = {code: None for code in range(128) if disallowed_chars_pattern.match(chr(code))}
+
+class TextCompressor:
+    # Single-pass compressor: drops disallowed characters, lowercases and removes stopwords chunk by chunk.
+    # Character removal and lowercasing act per character, so only the trailing partial word of each chunk
+    # has to be carried over to the next one
+    def __init__(self, output_file, consumers=None):
+        self.consumers = list(consumers or [])
+        self.file = open(output_file, "w", encoding="utf-8")
+        self.carry = ""
+        self.empty = True
+        self.stop_words = get_stop_words()
+
+    def feed(self, text):
+        start = time.perf_counter()
+        size = len(text)
+        if text.isascii():
+            text = text.translate(ascii_disallowed_chars).lower()
+        else:
+            text = disallowed_chars_pattern.sub("", text).lower()
+        if not text:
+            run_stats.add("compress", time.perf_counter() - start, bytes_in=size)
+            return
+
+        words = (self.carry + text).split()
+        self.carry = words.pop() if words and not text[-1].isspace() else ""
+        self.write_words(words, start, size)
+
+    def write_words(self, words, start=None, size=0):
+        # Compressed chunks go to the consumers after the stage timer stops, so their counting is not included
+        start = start or time.perf_counter()
+        words = [word for word in words if word not in self.stop_words]
+        chunk = " ".join(words)
+        if chunk:
+            if not self.empty:
+                chunk = " " + chunk
+            self.empty = False
+            self.file.write(chunk)
+        run_stats.add("compress", time.perf_counter() - start, bytes_in=size, bytes_out=len(chunk))
+        if not chunk:
+            return
+        for consumer in self.consumers:
+            consumer.feed(chunk)
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.write_words([self.carry] if self.carry else [])
+        self.carry = ""
+        self.file.close()
+        for consumer in self.consumers:
+            consumer.close()
 
 def is_same_domain(base_url, new_url):
     return urlparse(base_url).netloc == urlparse(new_url).netloc
@@ -331,97 +1588,891 @@ def is_within_depth(base_url, current_url, max_depth):
 
     return len(current_parts) - len(base_parts) <= max_depth
 
-def process_pdf(url):
-    response = requests.get(url)
-    response.raise_for_status()
+def get_http_session():
+    # One pooled session shared by every network source, so connections are reused across requests
+    global http_session
+    with http_session_lock:
+        if http_session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=16, pool_maxsize=max(crawl_workers, 16)
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            http_session = session
+    return http_session
+
+def host_slot(url):
+    # Caps the number of in-flight requests per host at `crawl_max_per_host`
+    netloc = urlparse(url).netloc
+    with host_slots_lock:
+        slot = host_slots.get(netloc)
+        if slot is None:
+            slot = host_slots[netloc] = threading.BoundedSemaphore(crawl_max_per_host)
+    return slot
+
+def cached_get(url, source, headers=None, session=None, timeout=None, on_chunk=None, unchanged_since=None):
+    # GET through the on-disk HTTP cache: fresh entries are served directly, stale ones are revalidated
+    # with If-None-Match / If-Modified-Since, and offline mode never touches the network.
+    # on_chunk(response, chunk) sees the body as it downloads; cached bodies arrive as a single chunk.
+    # unchanged_since (epoch seconds, e.g. a sitemap lastmod) also counts entries stored after it as fresh
+    start = time.perf_counter()
+    headers = dict(headers or {})
+    # Responses fetched with a token are only served to requests made with the same token
+    auth_scope = hashlib.sha256(headers["Authorization"].encode("utf-8")).hexdigest() if "Authorization" in headers else ""
+    key = hashlib.sha256(f"{url}\n{headers.get('Accept', '')}\n{auth_scope}".encode("utf-8")).hexdigest()
+    index_path = os.path.join(http_cache_dir, "index", key[:2], key + ".json")
+    entry = pin_http_cache_entry(index_path)
+    try:
+        return cached_get_entry(url, source, headers, session, timeout, on_chunk, unchanged_since, start, index_path, entry)
+    finally:
+        unpin_http_cache_entry(entry)
+
+def cached_get_entry(url, source, headers, session, timeout, on_chunk, unchanged_since, start, index_path, entry):
+    # The rest of cached_get, run while the loaded entry (if any) is pinned
+    if entry and (
+        offline_mode
+        or time.time() - entry["stored_at"] < http_cache_ttl.get(source, 0)
+        or (unchanged_since is not None and entry["stored_at"] >= unchanged_since)
+    ):
+        run_stats.http_cache_outcome("fresh")
+        run_stats.cache_hit("fresh")
+        response = cached_response(index_path, entry)
+        run_stats.add("fetch", time.perf_counter() - start, len(response.content), file=url)
+        if on_chunk:
+            on_chunk(response, response.content)
+        return response
+    if offline_mode:
+        raise requests.exceptions.ConnectionError(f"{url} is not in the HTTP cache (offline mode)")
+
+    if entry:
+        if entry["headers"].get("ETag"):
+            headers["If-None-Match"] = entry["headers"]["ETag"]
+        if entry["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+
+    request_start = time.perf_counter()
+    response = (session or get_http_session()).get(url, headers=headers, timeout=timeout, stream=on_chunk is not None)
+    latency = time.perf_counter() - request_start
+    response.from_cache = False
+    if entry and response.status_code == 304:
+        response.close()
+        run_stats.http_cache_outcome("revalidated")
+        run_stats.request(latency, response.status_code, 0, "revalidated")
+        entry["stored_at"] = time.time()
+        write_cache_file(index_path, json.dumps(entry).encode("utf-8"))
+        response = cached_response(index_path, entry)
+        run_stats.add("fetch", time.perf_counter() - start, len(response.content), file=url)
+        if on_chunk:
+            on_chunk(response, response.content)
+        return response
+
+    if on_chunk:
+        chunks = []
+        for chunk in response.iter_content(crawl_chunk_size):
+            chunks.append(chunk)
+            on_chunk(response, chunk)
+        response._content = b"".join(chunks)
+    run_stats.http_cache_outcome("downloaded")
+    run_stats.request(latency, response.status_code, len(response.content), "downloaded")
+    if response.status_code == 200:
+        store_http_cache_entry(index_path, url, response)
+    run_stats.add("fetch", time.perf_counter() - start, len(response.content), file=url)
+    return response
+
+def pin_http_cache_entry(index_path):
+    # Loads an index entry and keeps eviction away from its body until it is unpinned, so a response being
+    # served or revalidated never loses the object it points to
+    with http_cache_lock:
+        entry = load_http_cache_entry(index_path)
+        if entry:
+            http_cache_pins[entry["sha256"]] = http_cache_pins.get(entry["sha256"], 0) + 1
+    return entry
+
+def unpin_http_cache_entry(entry):
+    if not entry:
+        return
+    with http_cache_lock:
+        http_cache_pins[entry["sha256"]] -= 1
+        if not http_cache_pins[entry["sha256"]]:
+            del http_cache_pins[entry["sha256"]]
+
+def load_http_cache_entry(index_path):
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(http_cache_object_path(entry["sha256"])):
+        return None
+    return entry
+
+def http_cache_object_path(digest):
+    return os.path.join(http_cache_dir, "objects", digest[:2], digest)
+
+def cached_response(index_path, entry):
+    # Touching the index entry records the access time used for LRU eviction
+    os.utime(index_path)
+    with open(http_cache_object_path(entry["sha256"]), "rb") as f:
+        content = f.read()
+
+    response = requests.Response()
+    response.status_code = 200
+    response.url = entry["url"]
+    response.headers = requests.structures.CaseInsensitiveDict(entry["headers"])
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response._content = content
+    response.from_cache = True
+    return response
+
+def store_http_cache_entry(index_path, url, response):
+    # Bodies are content-addressed, so identical responses for different URLs are stored once
+    content = response.content
+    digest = hashlib.sha256(content).hexdigest()
+    object_path = http_cache_object_path(digest)
+    if not os.path.exists(object_path):
+        write_cache_file(object_path, content)
+        track_http_cache_size(len(content))
+
+    kept_headers = ("Content-Type", "ETag", "Last-Modified", "Link")
+    entry = {
+        "url": url,
+        "sha256": digest,
+        "size": len(content),
+        "stored_at": time.time(),
+        "headers": {name: response.headers[name] for name in kept_headers if name in response.headers},
+    }
+    write_cache_file(index_path, json.dumps(entry).encode("utf-8"))
 
-    with open("temp.pdf", "wb") as pdf_file:
-        pdf_file.write(response.content)
+def track_http_cache_size(added_bytes):
+    global http_cache_size
+    with http_cache_lock:
+        if http_cache_size is None:
+            http_cache_size = sum(entry["size"] for _, entry in http_cache_entries(unique=True))
+        else:
+            http_cache_size += added_bytes
+        if http_cache_size > http_cache_max_bytes:
+            http_cache_size = evict_http_cache(http_cache_max_bytes * 0.9)
+
+def http_cache_entries(unique=False):
+    seen = set()
+    for root, _, files in os.walk(os.path.join(http_cache_dir, "index")):
+        for name in files:
+            index_path = os.path.join(root, name)
+            entry = load_http_cache_entry(index_path)
+            if entry is None or (unique and entry["sha256"] in seen):
+                continue
+            seen.add(entry["sha256"])
+            yield index_path, entry
+
+def evict_http_cache(target_bytes):
+    # Drops the least recently used entries until the objects they referenced fit in target_bytes. Runs under
+    # http_cache_lock; entries whose body is pinned by a request in progress are skipped
+    entries = sorted(http_cache_entries(), key=lambda item: os.path.getmtime(item[0]))
+    references = {}
+    for _, entry in entries:
+        references[entry["sha256"]] = references.get(entry["sha256"], 0) + 1
+    total = sum({entry["sha256"]: entry["size"] for _, entry in entries}.values())
+
+    for index_path, entry in entries:
+        if total <= target_bytes:
+            break
+        if entry["sha256"] in http_cache_pins:
+            continue
+        os.remove(index_path)
+        references[entry["sha256"]] -= 1
+        if references[entry["sha256"]] == 0:
+            os.remove(http_cache_object_path(entry["sha256"]))
+            total -= entry["size"]
+    return total
+
+def select_pdf_pages(page_count):
+    first, last = pdf_page_range or (1, None)
+    pages = list(range(first - 1, page_count if last is None else min(last, page_count)))
+    return pages[:pdf_max_pages] if pdf_max_pages is not None else pages
+
+def iter_pdf_pages(pdf_content):
+    # Time spent extracting counts as the convert stage; time the caller spends between pages does not
+    pages = extract_pdf_page_texts(pdf_content)
+    seconds = 0.0
+    extracted = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            text = next(pages, None)
+            seconds += time.perf_counter() - start
+            if text is None:
+                break
+            extracted += len(text)
+            yield text
+    finally:
+        run_stats.add("convert", seconds, len(pdf_content), extracted)
+
+def extract_pdf_page_texts(pdf_content):
+    # Yields page text in page order; large documents are split into page batches extracted on the shared
+    # PDF process pool. The document goes to the workers as a temporary file, which each parses once
+    from PyPDF2 import PdfReader
+
+    pdf_reader = PdfReader(io.BytesIO(pdf_content))
+    pages = select_pdf_pages(len(pdf_reader.pages))
+    if pdf_workers <= 1 or len(pages) < pdf_parallel_min_pages:
+        for page in pages:
+            yield pdf_reader.pages[page].extract_text()
+        return
+
+    batches = [pages[i:i + pdf_batch_pages] for i in range(0, len(pages), pdf_batch_pages)]
+    with tempfile.NamedTemporaryFile(prefix="1filellm-", suffix=".pdf", delete=False) as pdf_file:
+        pdf_file.write(pdf_content)
+    try:
+        for texts in get_pdf_pool().map(extract_pdf_pages, itertools.repeat(pdf_file.name), batches):
+            yield from texts
+    finally:
+        os.remove(pdf_file.name)
+
+def get_pdf_pool():
+    # One pool for the whole process, shared by every thread that extracts PDFs, so concurrent crawl workers
+    # and batch inputs never run more than pdf_workers processes between them. Workers are spawned, not
+    # forked: a child forked while other threads hold a lock (logging, urllib3, sqlite) can deadlock on it
+    global pdf_pool
+    with pdf_pool_lock:
+        if pdf_pool is None:
+            import multiprocessing
+
+            pdf_pool = ProcessPoolExecutor(max_workers=pdf_workers, mp_context=multiprocessing.get_context("spawn"))
+    return pdf_pool
+
+def extract_pdf_pages(pdf_path, pages):
+    # Runs in a pool worker, which keeps the parsed document for the next batch of the same file
+    global pdf_worker_reader
+    if pdf_worker_reader is None or pdf_worker_reader[0] != pdf_path:
+        from PyPDF2 import PdfReader
+
+        with open(pdf_path, "rb") as f:
+            pdf_worker_reader = (pdf_path, PdfReader(io.BytesIO(f.read())))
+    return [pdf_worker_reader[1].pages[page].extract_text() for page in pages]
+
+def write_pdf_text(pdf_content, output, separator=""):
+    for index, text in enumerate(iter_pdf_pages(pdf_content)):
+        if index and separator:
+            output.write(separator)
+        output.write(text)
+
+def extract_pdf_text(pdf_content):
+    return " ".join(iter_pdf_pages(pdf_content))
 
-    text = []
-    with open("temp.pdf", "rb") as pdf_file:
-        pdf_reader = PdfReader(pdf_file)
-        for page in range(len(pdf_reader.pages)):
-            text.append(pdf_reader.pages[page].extract_text())
+def process_pdf(url):
+    response = cached_get(url, "pdf")
+    response.raise_for_status()
+    return extract_pdf_text(response.content)
+
+class PageTextExtractor(HTMLParser):
+    # Streaming replacement for BeautifulSoup(html, "html.parser") + removing script/style/head/title/meta +
+    # get_text("\n", strip=True) + find_all("a", href=True), without building a tree. It mirrors how
+    # BeautifulSoup groups text: everything between two markup events is one string, open tags are tracked
+    # on a stack and an end tag closes up to the most recent open tag of that name
+    skipped_tags = frozenset(["script", "style", "head", "title", "template", "rt", "rp"])
+    void_tags = frozenset([
+        "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem", "meta", "param",
+        "source", "track", "wbr", "basefont", "bgsound", "command", "frame", "image", "isindex", "nextid", "spacer",
+    ])
 
-    os.remove("temp.pdf")
-    return " ".join(text)
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.open_tags = []
+        self.open_counts = {}
+        self.skipping = 0
+        self.closed_void_tags = []
+        self.data = []
+        self.strings = []
+        self.links = []
+        self.head = b""
+        self.decoder = None
+        self.undecodable = False
+
+    def feed_bytes(self, chunk):
+        # The encoding is picked from the first 2KB, like BeautifulSoup's declared-encoding sniffing. Bytes
+        # that do not decode under it stop the parse; finish() then returns None and the page is left to
+        # extract_page_text_soup, which falls back through the same guesses BeautifulSoup makes
+        if self.undecodable:
+            return
+        try:
+            if self.decoder is None:
+                self.head += chunk
+                if len(self.head) >= 2048:
+                    self.start_decoding()
+            elif chunk:
+                self.feed(self.decoder.decode(chunk))
+        except UnicodeDecodeError:
+            self.undecodable = True
+
+    def start_decoding(self):
+        try:
+            self.decoder = codecs.getincrementaldecoder(sniff_html_encoding(self.head))()
+        except LookupError:
+            self.decoder = codecs.getincrementaldecoder("utf-8")()
+        head, self.head = self.head, b""
+        self.feed(self.decoder.decode(head))
+
+    def finish(self):
+        # (text, links), or None when the bytes did not decode
+        try:
+            if not self.undecodable:
+                if self.decoder is None:
+                    self.start_decoding()
+                self.feed(self.decoder.decode(b"", final=True))
+        except UnicodeDecodeError:
+            self.undecodable = True
+        if self.undecodable:
+            return None
+        self.close()
+        self.flush()
+        return "\n".join(self.strings), self.links
+
+    def flush(self):
+        if self.data:
+            text = "".join(self.data).strip()
+            self.data = []
+            if text and not self.skipping:
+                self.strings.append(text)
+
+    def handle_starttag(self, tag, attrs, void_closes=True):
+        self.flush()
+        if tag == "a":
+            href = None
+            for name, value in attrs:
+                if name == "href":
+                    href = value or ""
+            if href is not None:
+                self.links.append(href)
+        if void_closes and tag in self.void_tags:
+            self.closed_void_tags.append(tag)
+            return
+        self.open_tags.append(tag)
+        self.open_counts[tag] = self.open_counts.get(tag, 0) + 1
+        if tag in self.skipped_tags:
+            self.skipping += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, void_closes=False)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        # A redundant end tag of an already closed void element is ignored without ending the text run
+        if tag in self.closed_void_tags:
+            self.closed_void_tags.remove(tag)
+            return
+        self.flush()
+        if not self.open_counts.get(tag):
+            return
+        while True:
+            closed = self.open_tags.pop()
+            self.open_counts[closed] -= 1
+            if closed in self.skipped_tags:
+                self.skipping -= 1
+            if closed == tag:
+                break
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_entityref(self, name):
+        self.data.append(html_entities.get(name + ";", f"&{name}"))
+
+    def handle_charref(self, name):
+        try:
+            code = int(name[1:], 16) if name[:1] in ("x", "X") else int(name)
+            if code < 256:
+                # Numeric references below 256 are commonly meant as windows-1252
+                try:
+                    char = bytes([code]).decode("windows-1252")
+                except UnicodeDecodeError:
+                    char = chr(code)
+            else:
+                char = chr(code)
+        except (ValueError, OverflowError):
+            char = "\N{REPLACEMENT CHARACTER}"
+        self.data.append(char)
+
+    def unknown_decl(self, data):
+        self.flush()
+        if data.upper().startswith("CDATA["):
+            self.data.append(data[len("CDATA["):])
+            self.flush()
+
+    def handle_comment(self, data):
+        self.flush()
+
+    def handle_decl(self, decl):
+        self.flush()
+
+    def handle_pi(self, data):
+        self.flush()
+
+# The declarations BeautifulSoup's EncodingDetector looks for: an XML declaration in the first 1KB, then a <meta> charset
+xml_charset_pattern = re.compile(rb"""^\s*<\?.*encoding=['"](.*?)['"].*\?>""", re.I)
+html_charset_pattern = re.compile(rb"""<\s*meta[^>]+charset\s*=\s*["']?([^>]*?)[ /;'">]""", re.I)
+
+def sniff_html_encoding(head):
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    match = xml_charset_pattern.search(head, 0, 1024) or html_charset_pattern.search(head)
+    return match.group(1).decode("ascii", "replace").lower() if match else "utf-8"
+
+def extract_page_text_soup(content):
+    # The original BeautifulSoup extraction, for bodies PageTextExtractor does not handle: textual responses
+    # other than text/html, and HTML whose bytes do not decode under the encoding sniffed from its first 2KB
+    from bs4 import BeautifulSoup, Comment
+
+    soup = BeautifulSoup(content, "html.parser")
+    for element in soup(["script", "style", "head", "title", "meta", "[document]"]):
+        element.decompose()
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+    return soup.get_text(separator="\n", strip=True), [link["href"] for link in soup.find_all("a", href=True)]
+
+def crawl_content_kind(clean_url, response):
+    # "pdf", "html" for the streaming extractor, "markup" for other textual bodies, or None for binary ones
+    content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if clean_url.endswith(".pdf") or content_type == "application/pdf":
+        return "pdf"
+    if content_type == "text/html":
+        return "html"
+    if not content_type or content_type.startswith("text/") or content_type.endswith("xml"):
+        return "markup"
+    return None
+
+def fetch_crawl_page(session, url, clean_url, include_pdfs, lastmod=None):
+    # text/html is parsed chunk by chunk while it downloads; PDFs and other bodies never reach that parser
+    source = "pdf" if clean_url.endswith(".pdf") else "page"
+    extractor = PageTextExtractor()
+    parse_seconds = 0.0
+
+    def on_chunk(response, chunk):
+        nonlocal parse_seconds
+        if crawl_content_kind(clean_url, response) == "html":
+            start = time.perf_counter()
+            extractor.feed_bytes(chunk)
+            parse_seconds += time.perf_counter() - start
+
+    with host_slot(url):
+        response = cached_get(url, source, session=session, timeout=crawl_timeout, on_chunk=on_chunk, unchanged_since=lastmod)
+
+    kind = crawl_content_kind(clean_url, response)
+    if kind == "pdf":
+        return (extract_pdf_text(response.content) if include_pdfs else ""), []
+    if kind is None:
+        return "", []
+
+    start = time.perf_counter()
+    page = extractor.finish() if kind == "html" else None
+    text, links = page if page is not None else extract_page_text_soup(response.content)
+    parse_seconds += time.perf_counter() - start
+    run_stats.add("convert", parse_seconds, len(response.content), len(text), file=clean_url)
+    return text, links
 
 def crawl_and_extract_text(
-    base_url, output_file, urls_list_file, max_depth, include_pdfs, ignore_epubs
+    base_url, output_file, urls_list_file, max_depth, include_pdfs, ignore_epubs, state_file=None
 ):
-    visited_urls = set()
-    urls_to_visit = [(base_url, 0)]
-    processed_urls = []
-    all_text = "##### EXTRACTED TEXT BELOW #####\n"
-
-    while urls_to_visit:
-        current_url, current_depth = urls_to_visit.pop(0)
-        clean_url = current_url.split("#")[0]
-
-        if (
-            clean_url not in visited_urls
-            and is_same_domain(base_url, clean_url)
-            and is_within_depth(base_url, clean_url, max_depth)
-        ):
-            if ignore_epubs and clean_url.endswith(".epub"):
-                continue
+    with open(output_file, "w", encoding="utf-8") as output:
+        write_crawled_text(base_url, output, urls_list_file, max_depth, include_pdfs, ignore_epubs, state_file=state_file)
 
-            try:
-                response = requests.get(current_url)
-                soup = BeautifulSoup(response.content, "html.parser")
-                visited_urls.add(clean_url)
+def write_crawled_text(
+    base_url, output, urls_list_file, max_depth, include_pdfs, ignore_epubs, max_workers=None, state_file=None
+):
+    # Frontier, visited set and extracted page text live in a CrawlState store; with a state file the crawl
+    # is checkpointed to disk and can be resumed after an interruption
+    max_workers = max_workers or crawl_workers
+    session = get_http_session()
+    settings = {"base_url": base_url, "max_depth": max_depth, "include_pdfs": include_pdfs, "ignore_epubs": ignore_epubs}
+    state = CrawlState(state_file, settings, resume=crawl_resume)
+
+    def should_visit(url):
+        return (
+            is_same_domain(base_url, url)
+            and is_within_depth(base_url, url, max_depth)
+            and (include_pdfs or not url.endswith(".pdf"))
+            and not (ignore_epubs and url.endswith(".epub"))
+        )
 
-                if clean_url.endswith(".pdf") and include_pdfs:
-                    text = process_pdf(clean_url)
-                else:
-                    for element in soup(
-                        ["script", "style", "head", "title", "meta", "[document]"]
-                    ):
-                        element.decompose()
-                    comments = soup.find_all(
-                        string=lambda text: isinstance(text, Comment)
-                    )
-                    for comment in comments:
-                        comment.extract()
-                    text = soup.get_text(separator="\n", strip=True)
+    with state, ContextThreadPool(max_workers=max_workers) as executor:
+        if state.resumed:
+            console.print(f"Resuming crawl: {state.done_count()} pages done, {state.queued_count()} queued", style="bold green")
+
+        clean_base_url = base_url.split("#")[0]
+        if should_visit(clean_base_url):
+            state.enqueue(clean_base_url, 0)
+        if crawl_sitemap and not state.resumed:
+            # Every in-scope page the sitemap lists is queued up front, so whole batches fetch in parallel
+            # instead of waiting for links to be discovered level by level
+            base_depth = len(urlparse(clean_base_url).path.rstrip("/").split("/"))
+            seeded = 0
+            for url, lastmod in fetch_sitemap_urls(clean_base_url, session):
+                url = url.split("#")[0]
+                if should_visit(url):
+                    state.enqueue(url, len(urlparse(url).path.rstrip("/").split("/")) - base_depth, lastmod)
+                    seeded += 1
+            console.print(f"Seeded {seeded} URLs from the sitemap", style="bold green")
+
+        while True:
+            # Fetch the head of the frontier concurrently, then handle the results in frontier order
+            # so the pages are stored in the order of a sequential breadth-first crawl
+            batch = [
+                (url_id, clean_url, depth, executor.submit(fetch_crawl_page, session, clean_url, clean_url, include_pdfs, lastmod))
+                for url_id, clean_url, depth, lastmod in state.next_batch(max_workers * 2)
+            ]
+            if not batch:
+                break
+
+            for url_id, clean_url, current_depth, future in batch:
+                try:
+                    text, links = future.result()
+                except requests.RequestException as e:
+                    console.print(f"Failed to retrieve {clean_url}: {e}", style="bold red")
+                    state.mark_failed(url_id)
+                    continue
 
                 console.print(f"[bold dark_orange3]Processing:[/bold dark_orange3] [royal_blue1]{clean_url}[/royal_blue1]")
-                all_text += f"\n\n# <URL START> ------------------------------------\n"
-                all_text += f"# {clean_url} #\n\n{text}"
-                all_text += f"\n# ------------------------------------- </URL END>\n\n"
-                processed_urls.append(clean_url)
+                state.mark_done(url_id, text)
                 console.print(f"[bold light_green]Processed:[/bold light_green] [royal_blue1]{clean_url}[/royal_blue1]")
 
                 if current_depth < max_depth:
-                    for link in soup.find_all("a", href=True):
-                        new_url = urljoin(current_url, link["href"]).split("#")[0]
-                        if (
-                            new_url not in visited_urls
-                            and is_within_depth(base_url, new_url, max_depth)
-                            and (include_pdfs or not new_url.endswith(".pdf"))
-                            and not (ignore_epubs and new_url.endswith(".epub"))
-                        ):
-                            urls_to_visit.append((new_url, current_depth + 1))
+                    for href in links:
+                        new_url = urljoin(clean_url, href).split("#")[0]
+                        if should_visit(new_url):
+                            state.enqueue(new_url, current_depth + 1)
+            state.checkpoint()
+
+        # The output opens with the list of processed URLs, which is only complete once the crawl ends, so the
+        # pages are written from the store afterwards
+        processed_urls = state.done_urls()
+        processed_urls_string = "\n".join(processed_urls)
+        output.write(f"Generated text from the website: {base_url}. This includes content from the base page and all linked pages up to {max_depth} levels deep.\n\nProcessed URLs:\n{processed_urls_string}\n\n")
+        output.write("##### EXTRACTED TEXT BELOW #####\n")
+
+        boilerplate = None
+        if crawl_strip_boilerplate:
+            boilerplate = BoilerplateFilter()
+            for _, text in state.pages():
+                boilerplate.add_page(text)
+            boilerplate.finish()
+        for clean_url, text in state.pages():
+            mark_section(output, clean_url)
+            output.write(f"\n\n# <URL START> ------------------------------------\n")
+            output.write(f"# {clean_url} #\n\n{boilerplate.strip(text) if boilerplate else text}")
+            output.write(f"\n# ------------------------------------- </URL END>\n\n")
+        if boilerplate:
+            boilerplate.report()
+
+    with open(urls_list_file, "w", encoding="utf-8") as urls_file:
+        for url in processed_urls:
+            urls_file.write(url + "\n")
+
+    # The frontier is empty here, and only an interrupted crawl needs its state, also when this run resumed one
+    if state_file and not crawl_keep_state:
+        os.remove(state_file)
+
+    return processed_urls
+
+class BoilerplateFilter:
+    # Cross-page boilerplate detection in two linear passes over the crawled text. Each line (one per text
+    # node) is keyed by its normalized text; long lines also get a one-permutation MinHash signature of their
+    # word 3-grams (shingle hashes binned into bands, the smallest `rows` of a band form an LSH key) and join
+    # the class whose first line shares at least min_band_matches keys and is boilerplate_similarity similar,
+    # so near-duplicates such as "Last updated on <date>" footers count together. Only the first line of a
+    # class is indexed by band, so classes never grow by chaining. A class found on more than
+    # boilerplate_threshold of the pages is boilerplate
+    bands = 16
+    rows = 1
+    min_band_matches = 2  # one shared phrase, such as "in order to", can match one band but never two
+    max_band_classes = 8  # classes indexed per band key, which bounds the work per line when a phrase is common
+
+    def __init__(self):
+        self.page_count = 0
+        self.classes = {}
+        self.class_count = 0
+        self.counts = {}
+        self.band_classes = {}
+        self.class_shingles = {}
+        self.frequent = set()
+        self.removed_lines = set()
+        self.removed_tokens = 0
+
+    def line_key(self, line):
+        return " ".join(line.lower().split())
+
+    def add_page(self, text):
+        self.page_count += 1
+        # In page order, so the first line of each class is the same from run to run
+        for key in dict.fromkeys(self.line_key(line) for line in text.splitlines()):
+            if not key:
+                continue
+            if key not in self.classes:
+                words = key.split()
+                if len(words) >= boilerplate_minhash_words:
+                    self.classes[key] = self.near_duplicate_class(words)
+                else:
+                    self.classes[key] = self.new_class()
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def new_class(self):
+        self.class_count += 1
+        return self.class_count
+
+    def near_duplicate_class(self, words):
+        # crc32 rather than hash(), which is salted per process, so the output does not change between runs
+        shingles = sorted({zlib.crc32(" ".join(words[i:i + 3]).encode("utf-8")) for i in range(len(words) - 2)})
+        bins = {}
+        for shingle in shingles:
+            band = bins.setdefault(shingle % self.bands, [shingle % self.bands])
+            if len(band) <= self.rows:
+                band.append(shingle)
+        band_keys = [tuple(band) for band in bins.values() if len(band) > self.rows]
+        matches = Counter(itertools.chain.from_iterable(self.band_classes.get(band_key, ()) for band_key in band_keys))
+        shingle_set = frozenset(shingles)
+        best_class, best_similarity = None, boilerplate_similarity
+        for class_id, count in matches.most_common():
+            if count < self.min_band_matches:
+                break
+            leader = self.class_shingles[class_id]
+            similarity = len(shingle_set & leader) / len(shingle_set | leader)
+            if similarity >= best_similarity:
+                best_class, best_similarity = class_id, similarity
+        if best_class is not None:
+            return best_class
+        class_id = self.new_class()
+        self.class_shingles[class_id] = shingle_set
+        for band_key in band_keys:
+            band_classes = self.band_classes.setdefault(band_key, [])
+            if len(band_classes) < self.max_band_classes:
+                band_classes.append(class_id)
+        return class_id
+
+    def finish(self):
+        if self.page_count < boilerplate_min_pages:
+            return
+        # Near-duplicate variants on one page are counted once each, which can only overstate a class slightly
+        class_counts = {}
+        for key, count in self.counts.items():
+            class_id = self.classes[key]
+            class_counts[class_id] = class_counts.get(class_id, 0) + count
+        limit = boilerplate_threshold * self.page_count
+        self.frequent = {key for key, class_id in self.classes.items() if class_counts[class_id] > limit}
+
+    def strip(self, text):
+        lines = text.splitlines()
+        frequent = [self.line_key(line) in self.frequent for line in lines]
+        kept, removed = [], []
+        for index, line in enumerate(lines):
+            boilerplate = frequent[index] and (
+                len(line.split()) >= boilerplate_min_words
+                or (index > 0 and frequent[index - 1])
+                or (index + 1 < len(lines) and frequent[index + 1])
+            )
+            (removed if boilerplate else kept).append(line)
+        kept_text = "\n".join(kept)
+        if removed:
+            self.removed_lines.update(self.line_key(line) for line in removed)
+            self.removed_tokens += get_token_count("\n".join(removed))
+        return kept_text
+
+    def report(self):
+        console.print(
+            f"Boilerplate: removed {self.removed_tokens} tokens, "
+            f"{len(self.removed_lines)} distinct lines repeated across {self.page_count} pages",
+            style="bold green",
+        )
+
+tracking_query_param_pattern = re.compile(r"utm_\w+|fbclid|gclid|msclkid|mc_cid|mc_eid|_ga|ref_src")
+
+def canonical_url(url):
+    # Key used to deduplicate crawl URLs: lowercase scheme and host, no default port, fragment or tracking
+    # parameters, sorted query, and "dir/", "dir" and "dir/index.html" treated as the same page
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        netloc = f"{netloc}:{parts.port}"
+    path = re.sub(r"/index\.html?$", "/", parts.path or "/")
+    if len(path) > 1:
+        path = path.rstrip("/") or "/"
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not tracking_query_param_pattern.fullmatch(key)
+    ))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+class CrawlState:
+    # SQLite-backed crawl frontier. URLs are deduplicated by canonical form when they are enqueued and are
+    # fetched in enqueue order; finished pages keep their text, in completion order, so an interrupted
+    # crawl can be resumed and its output rebuilt. Without a state file the store lives in memory
+    def __init__(self, state_file, settings, resume=False):
+        import sqlite3
+
+        if state_file and not resume and os.path.exists(state_file):
+            os.remove(state_file)
+        self.db = sqlite3.connect(state_file or ":memory:")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS urls (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                canonical TEXT UNIQUE,
+                url TEXT,
+                depth INTEGER,
+                lastmod REAL,
+                state INTEGER DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS urls_state ON urls (state, id);
+            CREATE TABLE IF NOT EXISTS pages (seq INTEGER PRIMARY KEY AUTOINCREMENT, url_id INTEGER, text TEXT);
+            """
+        )
+        stored = dict(self.db.execute("SELECT key, value FROM settings"))
+        encoded = {key: json.dumps(value) for key, value in settings.items()}
+        self.resumed = bool(stored) and stored == encoded
+        if stored and stored != encoded:
+            console.print("Crawl state belongs to a different crawl; starting over.", style="bold yellow")
+            self.db.executescript("DELETE FROM settings; DELETE FROM urls; DELETE FROM pages;")
+        if self.resumed:
+            # Pages that failed last time get another try
+            self.db.execute("UPDATE urls SET state = ? WHERE state = ?", (self.queued, self.failed))
+        else:
+            self.db.executemany("INSERT INTO settings VALUES (?, ?)", encoded.items())
+        self.db.commit()
+        self.last_checkpoint = time.monotonic()
+
+    queued, done, failed = 0, 1, 2
+
+    def enqueue(self, url, depth, lastmod=None):
+        # A sitemap lastmod for a URL that is already queued is kept for when it is fetched
+        self.db.execute(
+            """
+            INSERT INTO urls (canonical, url, depth, lastmod) VALUES (?, ?, ?, ?)
+            ON CONFLICT (canonical) DO UPDATE SET lastmod = excluded.lastmod
+            WHERE excluded.lastmod IS NOT NULL AND state = ?
+            """,
+            (canonical_url(url), url, depth, lastmod, self.queued),
+        )
 
-            except requests.RequestException as e:
-                console.print(f"Failed to retrieve {clean_url}: {e}", style="bold red")
+    def next_batch(self, size):
+        return self.db.execute(
+            "SELECT id, url, depth, lastmod FROM urls WHERE state = ? ORDER BY id LIMIT ?", (self.queued, size)
+        ).fetchall()
 
-    processed_urls_string = "\n".join(processed_urls)
-    header = f"Generated text from the website: {base_url}. This includes content from the base page and all linked pages up to {max_depth} levels deep.\n\nProcessed URLs:\n{processed_urls_string}\n\n"
+    def mark_done(self, url_id, text):
+        self.db.execute("UPDATE urls SET state = ? WHERE id = ?", (self.done, url_id))
+        self.db.execute("INSERT INTO pages (url_id, text) VALUES (?, ?)", (url_id, text))
 
-    all_text = header + all_text
+    def mark_failed(self, url_id):
+        self.db.execute("UPDATE urls SET state = ? WHERE id = ?", (self.failed, url_id))
 
-    with open(output_file, "w", encoding="utf-8") as file:
-        file.write(all_text)
+    def pages(self):
+        return self.db.execute("SELECT urls.url, pages.text FROM pages JOIN urls ON urls.id = pages.url_id ORDER BY pages.seq")
 
-    with open(urls_list_file, "w", encoding="utf-8") as urls_file:
-        for url in processed_urls:
-            urls_file.write(url + "\n")
+    def done_urls(self):
+        return [url for url, in self.db.execute("SELECT urls.url FROM pages JOIN urls ON urls.id = pages.url_id ORDER BY pages.seq")]
+
+    def done_count(self):
+        return self.db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def queued_count(self):
+        return self.db.execute("SELECT COUNT(*) FROM urls WHERE state = ?", (self.queued,)).fetchone()[0]
+
+    def checkpoint(self, force=False):
+        if force or time.monotonic() - self.last_checkpoint >= crawl_checkpoint_seconds:
+            self.db.commit()
+            self.last_checkpoint = time.monotonic()
 
-    return all_text
+    def close(self):
+        self.checkpoint(force=True)
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def fetch_sitemap_urls(base_url, session):
+    # (url, lastmod) for every page in the site's sitemaps. Sitemaps come from the robots.txt Sitemap lines,
+    # falling back to /sitemap.xml; sitemap indexes are followed level by level and their children fetched in parallel
+    parts = urlparse(base_url)
+    site_root = f"{parts.scheme}://{parts.netloc}"
+    sitemaps = []
+    try:
+        response = cached_get(f"{site_root}/robots.txt", "page", session=session, timeout=crawl_timeout)
+        if response.status_code == 200:
+            sitemaps = [
+                line.split(":", 1)[1].strip()
+                for line in response.content.decode("utf-8", errors="replace").splitlines()
+                if line.strip().lower().startswith("sitemap:")
+            ]
+    except requests.RequestException as e:
+        console.print(f"Failed to retrieve robots.txt: {e}", style="bold yellow")
+    sitemaps = sitemaps or [f"{site_root}/sitemap.xml"]
+
+    def fetch(sitemap_url):
+        try:
+            response = cached_get(sitemap_url, "page", session=session, timeout=crawl_timeout)
+            response.raise_for_status()
+            return parse_sitemap(response.content)
+        except (requests.RequestException, ET.ParseError, OSError, EOFError) as e:
+            console.print(f"Failed to read sitemap {sitemap_url}: {e}", style="bold yellow")
+            return [], []
+
+    pages, seen = [], set()
+    with ContextThreadPool(max_workers=crawl_workers) as executor:
+        while sitemaps:
+            batch = [url for url in dict.fromkeys(sitemaps) if url not in seen]
+            seen.update(batch)
+            sitemaps = []
+            for child_sitemaps, child_pages in executor.map(fetch, batch):
+                sitemaps.extend(child_sitemaps)
+                pages.extend(child_pages)
+    return pages
+
+def parse_sitemap(data):
+    # Returns (child sitemap URLs, [(page URL, lastmod epoch or None)]) for a sitemap or sitemap index,
+    # gzipped or not. Elements are cleared as they are parsed so large sitemaps stay small in memory
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    sitemaps, pages = [], []
+    loc = lastmod = None
+    for _, element in ET.iterparse(io.BytesIO(data)):
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag == "loc":
+            loc = (element.text or "").strip()
+        elif tag == "lastmod":
+            lastmod = parse_lastmod(element.text)
+        elif tag in ("url", "sitemap"):
+            if loc:
+                if tag == "sitemap":
+                    sitemaps.append(loc)
+                else:
+                    pages.append((loc, lastmod))
+            loc = lastmod = None
+            element.clear()
+    return sitemaps, pages
+
+def parse_lastmod(value):
+    # W3C datetime ("2024-05-01", "2024-05-01T12:00:00Z", ...) to epoch seconds; dates without a zone are UTC
+    try:
+        parsed = datetime.fromisoformat((value or "").strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
 
 def process_doi_or_pmid(identifier, output_file):
+    with open(output_file, "w", encoding="utf-8") as output:
+        write_doi_or_pmid(identifier, output)
+
+def write_doi_or_pmid(identifier, output):
+    from bs4 import BeautifulSoup
+
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 6.3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36",
         "Connection": "keep-alive",
@@ -455,182 +2506,475 @@ def process_doi_or_pmid(identifier, output_file):
         else:
             pdf_url = "https:/" + content
 
-        pdf_filename = f"{identifier.replace('/', '-')}.pdf"
-        wget.download(pdf_url, pdf_filename)
+        pdf_response = cached_get(pdf_url, "pdf", headers=headers, timeout=60)
+        pdf_response.raise_for_status()
+        write_pdf_text(pdf_response.content, output)
 
-        with open(pdf_filename, "rb") as pdf_file:
-            pdf_reader = PdfReader(pdf_file)
-            text = ""
-            for page in range(len(pdf_reader.pages)):
-                text += pdf_reader.pages[page].extract_text()
-
-        with open(output_file, "w", encoding="utf-8") as output:
-            output.write(text)
-
-        os.remove(pdf_filename)
         console.print(f"Identifier {identifier} processed successfully.", style="bold green")
     except (requests.RequestException, ValueError) as e:
         console.print(f"Error processing identifier {identifier}: {str(e)}", style="bold red")
         console.print("Sci-hub appears to be inaccessible or the document was not found. Please try again later.", style="bold yellow")
 
 def process_github_pull_request(pull_request_url, output_file):
+    with open(output_file, "w", encoding="utf-8") as output:
+        write_github_pull_request(pull_request_url, output)
+
+def write_github_pull_request(pull_request_url, output):
     # Extract repository owner, repository name, and pull request number from the URL
     url_parts = pull_request_url.split("/")
     repo_owner = url_parts[3]
     repo_name = url_parts[4]
     pull_request_number = url_parts[-1]
 
-    # Make API requests to retrieve pull request information
-    api_base_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/pulls/{pull_request_number}"
+    # The pull request, its diff and every page of both comment lists are fetched concurrently
+    repo_api_url = f"{github_api_url}/repos/{repo_owner}/{repo_name}"
+    api_base_url = f"{repo_api_url}/pulls/{pull_request_number}"
     headers = github_auth_headers()
-
-    # Retrieve pull request details
-    response = requests.get(api_base_url, headers=headers)
-    pull_request_data = response.json()
-
-    # Retrieve pull request diff
-    diff_url = pull_request_data["diff_url"]
-    diff_response = requests.get(diff_url, headers=headers)
-    pull_request_diff = diff_response.text
-
-    # Retrieve pull request comments and review comments
-    comments_url = pull_request_data["comments_url"]
-    review_comments_url = pull_request_data["review_comments_url"]
-    comments_response = requests.get(comments_url, headers=headers)
-    review_comments_response = requests.get(review_comments_url, headers=headers)
-    comments_data = comments_response.json()
-    review_comments_data = review_comments_response.json()
-
-    # Combine comments and review comments into a single list
-    all_comments = comments_data + review_comments_data
-
-    # Sort comments based on their position in the diff
-    all_comments.sort(key=lambda comment: comment.get("position") or float("inf"))
+    diff_headers = dict(headers, Accept="application/vnd.github.diff")
+
+    with ContextThreadPool(max_workers=4) as executor:
+        pull_request_future = executor.submit(cached_get, api_base_url, "github", headers=headers)
+        diff_future = executor.submit(cached_get, api_base_url, "github", headers=diff_headers)
+        comments_future = executor.submit(fetch_github_pages, f"{repo_api_url}/issues/{pull_request_number}/comments", headers)
+        review_comments_future = executor.submit(fetch_github_pages, f"{api_base_url}/comments", headers)
+
+        pull_request_response = pull_request_future.result()
+        pull_request_response.raise_for_status()
+        pull_request_data = pull_request_response.json()
+        diff_response = diff_future.result()
+        diff_response.raise_for_status()
+        pull_request_diff = diff_response.content.decode("utf-8", errors="replace")
+        comments_data = comments_future.result()
+        review_comments_data = review_comments_future.result()
+
+    # Review comments keyed by the diff line they belong to; outdated ones have no position
+    review_comments = {}
+    for comment in review_comments_data:
+        review_comments.setdefault((comment["path"], comment.get("position")), []).append(comment)
 
     # Format the retrieved pull request information
-    formatted_text = f"# Pull Request Information\n\n"
-    formatted_text += f"## Title: {pull_request_data['title']}\n\n"
-    formatted_text += f"## Description:\n{pull_request_data['body']}\n\n"
-    formatted_text += f"## Merge Details:\n"
-    formatted_text += f"{pull_request_data['user']['login']} wants to merge {pull_request_data['commits']} commit into {repo_owner}:{pull_request_data['base']['ref']} from {pull_request_data['head']['label']}\n\n"
-    formatted_text += f"## Diff and Comments:\n"
-
-    # Iterate through the diff and interleave comments
-    diff_lines = pull_request_diff.split("\n")
-    comment_index = 0
-    for line in diff_lines:
-        formatted_text += f"{line}\n"
-        while comment_index < len(all_comments) and all_comments[comment_index].get(
-            "position"
-        ) == diff_lines.index(line):
-            comment = all_comments[comment_index]
-            formatted_text += f"\n### Review Comment by {comment['user']['login']}:\n"
-            formatted_text += f"{comment['body']}\n\n"
-            formatted_text += f"Path: {comment['path']}\n"
-            formatted_text += f"Line: {comment['original_line']}\n\n"
-            comment_index += 1
+    mark_section(output, pull_request_url)
+    output.write(f"# Pull Request Information\n\n")
+    output.write(f"## Title: {pull_request_data['title']}\n\n")
+    output.write(f"## Description:\n{pull_request_data['body']}\n\n")
+    output.write(f"## Merge Details:\n")
+    output.write(f"{pull_request_data['user']['login']} wants to merge {pull_request_data['commits']} commit into {repo_owner}:{pull_request_data['base']['ref']} from {pull_request_data['head']['label']}\n\n")
+    output.write(f"## Diff and Comments:\n")
+    write_pull_request_diff(output, pull_request_diff, review_comments)
+
+    # Comments on lines that are no longer in the diff, then the conversation
+    unplaced_comments = [comment for comments in review_comments.values() for comment in comments]
+    if unplaced_comments:
+        output.write(f"\n## Outdated Review Comments:\n")
+        for comment in unplaced_comments:
+            write_review_comment(output, comment)
+    if comments_data:
+        output.write(f"\n## Comments:\n")
+        for comment in comments_data:
+            output.write(f"\n### Comment by {comment['user']['login']}:\n")
+            output.write(f"{comment['body']}\n")
 
     # Process the entire repository
     repo_url = f"https://github.com/{repo_owner}/{repo_name}"
-    repo_content = process_github_repo(repo_url)
-
-    # Concatenate the pull request information and repository content
-    final_output = f"{formatted_text}\n\n# Repository Content\n\n{repo_content}"
-
-    # Write the final output to the file
-    with open(output_file, "w", encoding="utf-8") as file:
-        file.write(final_output)
+    output.write("\n\n# Repository Content\n\n")
+    process_github_repo(repo_url, output)
 
     console.print(f"Pull request {pull_request_number} and repository content processed successfully.", style="bold green")
 
-    return final_output
+def write_pull_request_diff(output, diff, review_comments):
+    # One pass over the diff, interleaving review comments after the line they refer to. GitHub positions
+    # count the lines below the first "@@" header of each file, later hunk headers included, and restart
+    # at every "diff --git" line. Placed comments are removed from review_comments
+    path = None
+    position = None
+    pending = []
+    for line in diff.split("\n"):
+        if line.startswith("diff --git "):
+            path = line.rsplit(" b/", 1)[-1]
+            position = None
+        elif position is None:
+            if line.startswith("+++ b/"):
+                path = line[len("+++ b/"):]
+            elif line.startswith("@@"):
+                position = 0
+        else:
+            position += 1
+
+        pending.append(line)
+        comments = review_comments.pop((path, position), None) if position else None
+        if comments or len(pending) >= 1024:
+            output.write("\n".join(pending) + "\n")
+            pending = []
+        for comment in comments or ():
+            write_review_comment(output, comment)
+    if pending:
+        output.write("\n".join(pending) + "\n")
+
+def write_review_comment(output, comment):
+    output.write(f"\n### Review Comment by {comment['user']['login']}:\n")
+    output.write(f"{comment['body']}\n\n")
+    output.write(f"Path: {comment['path']}\n")
+    output.write(f"Line: {comment['original_line']}\n\n")
+
+def fetch_github_pages(url, headers):
+    # Every item of a paginated GitHub list endpoint, in order. Once the first page's Link header names
+    # the last page, the remaining pages are fetched concurrently; otherwise "next" links are followed
+    response = cached_get(f"{url}?per_page=100", "github", headers=headers)
+    response.raise_for_status()
+    items = response.json()
+
+    last_url = response.links.get("last", {}).get("url")
+    if last_url:
+        query = dict(parse_qsl(urlparse(last_url).query))
+        base_url = last_url.split("?")[0]
+        page_urls = [
+            f"{base_url}?{urlencode(dict(query, page=page))}" for page in range(2, int(query.get("page", 1)) + 1)
+        ]
+
+        def fetch_page(page_url):
+            page_response = cached_get(page_url, "github", headers=headers)
+            page_response.raise_for_status()
+            return page_response.json()
+
+        with ContextThreadPool(max_workers=github_workers) as executor:
+            for page_items in executor.map(fetch_page, page_urls):
+                items.extend(page_items)
+        return items
+
+    next_url = response.links.get("next", {}).get("url")
+    while next_url:
+        response = cached_get(next_url, "github", headers=headers)
+        response.raise_for_status()
+        items.extend(response.json())
+        next_url = response.links.get("next", {}).get("url")
+    return items
 
 def process_github_issue(issue_url, output_file):
+    with open(output_file, "w", encoding="utf-8") as output:
+        write_github_issue(issue_url, output)
+
+def write_github_issue(issue_url, output):
     # Extract repository owner, repository name, and issue number from the URL
     url_parts = issue_url.split("/")
     repo_owner = url_parts[3]
     repo_name = url_parts[4]
     issue_number = url_parts[-1]
 
-    # Make API requests to retrieve issue information
+    # The issue and every page of its comments are fetched concurrently
     api_base_url = (
-        f"https://api.github.com/repos/{repo_owner}/{repo_name}/issues/{issue_number}"
+        f"{github_api_url}/repos/{repo_owner}/{repo_name}/issues/{issue_number}"
     )
     headers = github_auth_headers()
+    with ContextThreadPool(max_workers=2) as executor:
+        issue_future = executor.submit(cached_get, api_base_url, "github", headers=headers)
+        comments_future = executor.submit(fetch_github_pages, f"{api_base_url}/comments", headers)
+        response = issue_future.result()
+        response.raise_for_status()
+        issue_data = response.json()
+        comments_data = comments_future.result()
 
-    # Retrieve issue details
-    response = requests.get(api_base_url, headers=headers)
-    issue_data = response.json()
-
-    # Retrieve issue comments
-    comments_url = issue_data["comments_url"]
-    comments_response = requests.get(comments_url, headers=headers)
-    comments_data = comments_response.json()
+    # Every file referenced by a line-range link is fetched once, up front
+    snippet_files = fetch_snippet_files(
+        [issue_data["body"] or ""] + [comment["body"] or "" for comment in comments_data], headers
+    )
 
     # Format the retrieved issue information
-    formatted_text = f"# Issue Information\n\n"
-    formatted_text += f"## Title: {issue_data['title']}\n\n"
-    formatted_text += f"## Description:\n{issue_data['body']}\n\n"
-    formatted_text += f"## Comments:\n"
+    mark_section(output, issue_url)
+    output.write(f"# Issue Information\n\n")
+    output.write(f"## Title: {issue_data['title']}\n\n")
+    output.write(f"## Description:\n{issue_data['body']}\n\n")
+    write_code_snippets(output, issue_data["body"] or "", snippet_files)
+    output.write(f"## Comments:\n")
 
     for comment in comments_data:
-        formatted_text += f"\n### Comment by {comment['user']['login']}:\n"
-        formatted_text += f"{comment['body']}\n"
-
-        # Extract code snippets from comment
-        code_snippets = re.findall(r"https://github.com/.*#L\d+-L\d+", comment["body"])
-        for snippet_url in code_snippets:
-            # Extract file path, start line, and end line from the snippet URL
-            url_parts = snippet_url.split("#")
-            file_url = url_parts[0].replace("/blob/", "/raw/")
-            line_range = url_parts[1]
-            start_line, end_line = map(int, line_range.split("-")[0][1:]), map(
-                int, line_range.split("-")[1][1:]
-            )
-
-            # Make API request to retrieve the file content
-            file_response = requests.get(file_url, headers=headers)
-            file_content = file_response.text
-
-            # Extract the code snippet based on the line range
-            code_lines = file_content.split("\n")[start_line - 1 : end_line]
-            code_snippet = "\n".join(code_lines)
-
-            # Add the code snippet to the formatted text
-            formatted_text += f"\n#### Code Snippet:\n```\n{code_snippet}\n```\n"
+        output.write(f"\n### Comment by {comment['user']['login']}:\n")
+        output.write(f"{comment['body']}\n")
+        write_code_snippets(output, comment["body"] or "", snippet_files)
 
     # Process the entire repository
     repo_url = f"https://github.com/{repo_owner}/{repo_name}"
-    repo_content = process_github_repo(repo_url)
-
-    # Concatenate the issue information and repository content
-    final_output = f"{formatted_text}\n\n# Repository Content\n\n{repo_content}"
-
-    # Write the final output to the file
-    with open(output_file, "w", encoding="utf-8") as file:
-        file.write(final_output)
+    output.write("\n\n# Repository Content\n\n")
+    process_github_repo(repo_url, output)
 
     console.print(f"Issue {issue_number} and repository content processed successfully.", style="bold green")
 
-    return final_output
-
-#! WIP - automatically restructure the 1st-pass content and remove useless/irrelevant/repetitive text
-# def clean_and_restructure_content(content):
-#     # Remove navigation and footer content
-#     lines = content.split('\n')
-#     cleaned_lines = []
-#     for line in lines:
-#         if 'Navigation' in line or 'index' in line or 'previous' in line or 'next' in line or '©' in line or 'Options' in line:
-#             continue
-#         cleaned_lines.append(line)
-
-#     # Join the cleaned lines
-#     cleaned_content = '\n'.join(cleaned_lines)
-#     return cleaned_content
-# # Clean and restructure the content
-# cleaned_content = clean_and_restructure_content(content)
+# https://github.com/<owner>/<repo>/blob/<ref>/<path>#L<start>[-L<end>]
+snippet_link_pattern = re.compile(r"https://github\.com/([^/\s]+)/([^/\s]+)/blob/([^/\s]+)/([^\s#?]+)#L(\d+)(?:-L(\d+))?")
+
+def fetch_snippet_files(texts, headers):
+    # Returns {(owner, repo, ref, path): lines} for every distinct file linked from the texts, fetched
+    # concurrently through the contents API; files that cannot be fetched map to None
+    files = {match.group(1, 2, 3, 4) for text in texts for match in snippet_link_pattern.finditer(text)}
+    raw_headers = dict(headers, Accept="application/vnd.github.raw")
+
+    def fetch_file(file):
+        owner, repo, ref, path = file
+        url = f"{github_api_url}/repos/{owner}/{repo}/contents/{path}?{urlencode({'ref': ref})}"
+        try:
+            response = cached_get(url, "raw", headers=raw_headers)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            console.print(f"Failed to retrieve code snippet file {path}: {e}", style="bold red")
+            return None
+        return response.content.decode("utf-8", errors="replace").split("\n")
+
+    with ContextThreadPool(max_workers=github_workers) as executor:
+        return dict(zip(files, executor.map(fetch_file, files)))
+
+def write_code_snippets(output, text, snippet_files):
+    for match in snippet_link_pattern.finditer(text):
+        file_lines = snippet_files.get(match.group(1, 2, 3, 4))
+        if file_lines is None:
+            continue
+        start_line = int(match.group(5))
+        end_line = int(match.group(6) or start_line)
+
+        # Extract the code snippet based on the line range
+        code_snippet = "\n".join(file_lines[start_line - 1 : end_line])
+        output.write(f"\n#### Code Snippet:\n```\n{code_snippet}\n```\n")
+
+class ShardWriter:
+    # Writes the output into shards as it is produced, cut only between files / URLs. Every section is
+    # appended to the open shard; once the token counter has finished counting it, the section is placed:
+    # it stays if the shard is still within the caps, otherwise it and whatever followed it (no more than
+    # the counter is behind) move to a new shard. A section larger than a cap gets a shard of its own.
+    # manifest.json maps every file / URL to its shard, byte offset and length within it, and token count
+    def __init__(self, shard_dir, manifest_file, counter, source_file, max_bytes=None, max_tokens=None):
+        self.shard_dir = shard_dir
+        self.manifest_file = manifest_file
+        self.counter = counter
+        self.stem = os.path.splitext(os.path.basename(source_file))[0]
+        self.max_bytes = max_bytes
+        self.max_tokens = max_tokens
+        self.manifest = {"source": source_file, "max_bytes": max_bytes, "max_tokens": max_tokens, "shards": [], "entries": []}
+        self.bounds = [(None, 0)]  # (label, start offset in the output) per section, in the counter's span order
+        self.placed = 0
+        self.shard_start = 0
+        os.makedirs(shard_dir, exist_ok=True)
+        for name in os.listdir(shard_dir):
+            if name.startswith(f"{self.stem}.") and name.endswith(".txt"):
+                os.remove(os.path.join(shard_dir, name))
+        self.open_shard()
+
+    def open_shard(self):
+        shard_file = os.path.join(self.shard_dir, f"{self.stem}.{len(self.manifest['shards']):04d}.txt")
+        self.manifest["shards"].append({"file": shard_file, "bytes": 0, "tokens": 0})
+        self.file = open(shard_file, "w+b")
+
+    def write(self, data):
+        self.file.write(data)
+
+    def begin_section(self, label, offset):
+        self.bounds.append((label, offset))
+        self.place(len(self.bounds) - 1)
+
+    def place(self, ended, end_offset=None):
+        # Places the sections before index ended that the counter has finished; end_offset ends the last one
+        last = min(self.counter.counted_spans(), ended)
+        for span in range(self.placed, last):
+            label, start = self.bounds[span]
+            end = self.bounds[span + 1][1] if span + 1 < len(self.bounds) else end_offset
+            if end == start:
+                continue
+            tokens = self.counter.span_tokens[span]
+            shard = self.manifest["shards"][-1]
+            over_bytes = self.max_bytes and shard["bytes"] + (end - start) > self.max_bytes
+            over_tokens = self.max_tokens and shard["tokens"] + tokens > self.max_tokens
+            if shard["bytes"] and (over_bytes or over_tokens):
+                self.move_tail(start)
+                shard = self.manifest["shards"][-1]
+            self.manifest["entries"].append({
+                "label": label if label is not None else "<preamble>",
+                "shard": len(self.manifest["shards"]) - 1,
+                "offset": start - self.shard_start,
+                "length": end - start,
+                "tokens": tokens,
+            })
+            shard["bytes"] += end - start
+            shard["tokens"] += tokens
+        self.placed = max(self.placed, last)
+
+    def move_tail(self, offset):
+        # Moves the output from offset on out of the open shard into a new one
+        previous = self.file
+        previous.flush()
+        previous.seek(offset - self.shard_start)
+        self.open_shard()
+        shutil.copyfileobj(previous, self.file, 1024 * 1024)
+        previous.truncate(offset - self.shard_start)
+        previous.close()
+        self.shard_start = offset
+
+    def close(self, end_offset):
+        # Called once the token counter has counted everything
+        self.place(len(self.bounds), end_offset)
+        self.file.close()
+        write_cache_file(self.manifest_file, json.dumps(self.manifest, indent=2).encode("utf-8"))
+        return len(self.manifest["shards"])
+
+def print_token_breakdown(counter):
+    from rich.table import Table
+
+    top_sections = counter.top_sections(token_report_rows)
+    if len(top_sections) < 2:
+        return
+
+    table = Table(title="Largest Sources by Token Count", title_style="bold chartreuse1", header_style="bold sky_blue1")
+    table.add_column("Tokens", justify="right", style="orchid")
+    table.add_column("Share", justify="right", style="pale_green3")
+    table.add_column("File / URL", style="royal_blue1", overflow="fold")
+    for label, count in top_sections:
+        table.add_row(f"{count:,}", f"{count / max(counter.total, 1):.1%}", label)
+    console.print(table)
+
+def start_profiler():
+    if profile_mode == "cprofile":
+        import cProfile
+
+        # cProfile only sees the main thread; pooled fetch and read work shows up as waiting on futures
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    if profile_mode == "tracemalloc":
+        import tracemalloc
+
+        tracemalloc.start(25)
+    return None
+
+def stop_profiler(profiler, output_dir, rows=20):
+    # Returns the profile summary stored in stats.json
+    if profile_mode == "cprofile":
+        import pstats
+
+        profiler.disable()
+        profile_file = os.path.join(output_dir, "profile.pstats")
+        profiler.dump_stats(profile_file)
+        entries = sorted(pstats.Stats(profiler).stats.items(), key=lambda item: item[1][3], reverse=True)
+        return {
+            "mode": "cprofile",
+            "file": profile_file,
+            "top_cumulative": [
+                {"function": f"{file}:{line}({name})", "calls": calls, "total_s": round(total, 4), "cumulative_s": round(cumulative, 4)}
+                for (file, line, name), (_, calls, total, cumulative, _) in entries[:rows]
+            ],
+        }
+    if profile_mode == "tracemalloc":
+        import tracemalloc
+
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            "mode": "tracemalloc",
+            "peak_bytes": peak,
+            "top_allocations": [
+                {"location": str(stat.traceback[0]), "bytes": stat.size, "blocks": stat.count}
+                for stat in snapshot.statistics("lineno")[:rows]
+            ],
+        }
+    return None
+
+def write_run_stats(stats_file, input_path, wall_seconds, output, uncompressed_counter, compressed_counter, profile=None):
+    # Stage sizes of text are in characters, sizes of raw downloads and file reads in bytes
+    stats = {
+        "input": input_path,
+        "wall_s": round(wall_seconds, 3),
+        "output_chars": output.bytes_written,
+        "tokens": {"uncompressed": uncompressed_counter.total, "compressed": compressed_counter.total},
+        **run_stats.to_dict(),
+    }
+    if stats_per_file:
+        for label, tokens in uncompressed_counter.sections.items():
+            stats["files"].setdefault(label, {})["tokens"] = tokens
+    else:
+        del stats["files"]
+    if profile:
+        stats["profile"] = profile
+    write_cache_file(stats_file, json.dumps(stats, indent=2).encode("utf-8"))
+
+def parse_size(value):
+    # "4096", "512K", "64M" or "2G"
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    value = value.strip().upper().rstrip("B")
+    if value and value[-1] in units:
+        size = int(float(value[:-1]) * units[value[-1]])
+    else:
+        size = int(value)
+    if size < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1 byte, got {value}")
+    return size
+
+def parse_page_range(value):
+    # "FIRST-LAST", "FIRST-" (to the last page) or a single page number
+    first, dash, last = value.partition("-")
+    try:
+        first = int(first)
+        last = int(last) if last else (None if dash else first)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected FIRST-LAST, FIRST- or PAGE, got {value!r}")
+    if first < 1 or (last is not None and last < first):
+        raise argparse.ArgumentTypeError(f"invalid page range {value!r}")
+    return first, last
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def non_negative_int(value):
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be at least 0, got {value}")
+    return number
+
+def parse_args():
+    global offline_mode, pdf_page_range, pdf_max_pages, stats_per_file, profile_mode, crawl_resume, crawl_keep_state
+    global crawl_max_depth, crawl_sitemap, crawl_strip_boilerplate, pack_max_tokens, shard_max_bytes, shard_max_tokens
+    global batch_workers
+    parser = argparse.ArgumentParser(description="Aggregate a local folder, repository, paper or website into one text file for LLM ingestion.")
+    parser.add_argument("input_path", nargs="?", help="Local path or supported URL; prompted for when omitted")
+    parser.add_argument("--batch", metavar="FILE", help="Process every input listed in FILE (one per line, - for stdin) into its own output directory")
+    parser.add_argument("--batch-workers", type=positive_int, metavar="N", help=f"Inputs processed at once in batch mode (default {batch_workers})")
+    parser.add_argument("--offline", action=argparse.BooleanOptionalAction, help="Serve network sources only from the HTTP cache")
+    parser.add_argument("--incremental", action="store_true", help="Reuse unchanged local files from the previous run's manifest")
+    parser.add_argument("--resume", action=argparse.BooleanOptionalAction, help="Continue an interrupted website crawl from its saved state")
+    parser.add_argument("--keep-crawl-state", action=argparse.BooleanOptionalAction, help="Keep the crawl state (with the text of every page) after a crawl completes")
+    parser.add_argument("--crawl-depth", type=non_negative_int, metavar="N", help=f"Follow links up to N levels below the start URL (default {crawl_max_depth})")
+    parser.add_argument("--sitemap", action=argparse.BooleanOptionalAction, help="Seed website crawls from robots.txt / sitemap.xml")
+    parser.add_argument("--strip-boilerplate", action=argparse.BooleanOptionalAction, help="Drop navigation and footer text repeated across crawled pages")
+    parser.add_argument("--max-tokens", type=positive_int, metavar="N", help="Pack local folders and repositories into N tokens, highest-priority files first")
+    parser.add_argument("--shard-bytes", type=parse_size, metavar="SIZE", help="Also split the output into shards of at most SIZE bytes (e.g. 64M)")
+    parser.add_argument("--shard-tokens", type=positive_int, metavar="N", help="Also split the output into shards of at most N tokens")
+    parser.add_argument("--pdf-pages", type=parse_page_range, metavar="FIRST-LAST", help="Only extract this page range from PDFs; FIRST- runs to the last page")
+    parser.add_argument("--pdf-max-pages", type=positive_int, metavar="N", help="Extract at most N pages per PDF")
+    parser.add_argument("--stats-per-file", action=argparse.BooleanOptionalAction, help="Break stage timings in stats.json down per file / URL")
+    parser.add_argument("--profile", choices=["cprofile", "tracemalloc"], help="Profile the whole run; the summary goes to stats.json")
+    args = parser.parse_args()
+
+    # Options left out keep the flag values set at the top of this file
+    offline_mode = args.offline if args.offline is not None else offline_mode
+    batch_workers = args.batch_workers if args.batch_workers is not None else batch_workers
+    crawl_resume = args.resume if args.resume is not None else crawl_resume
+    crawl_keep_state = args.keep_crawl_state if args.keep_crawl_state is not None else crawl_keep_state
+    crawl_max_depth = args.crawl_depth if args.crawl_depth is not None else crawl_max_depth
+    crawl_sitemap = args.sitemap if args.sitemap is not None else crawl_sitemap
+    crawl_strip_boilerplate = args.strip_boilerplate if args.strip_boilerplate is not None else crawl_strip_boilerplate
+    pack_max_tokens = args.max_tokens if args.max_tokens is not None else pack_max_tokens
+    shard_max_bytes = args.shard_bytes if args.shard_bytes is not None else shard_max_bytes
+    shard_max_tokens = args.shard_tokens if args.shard_tokens is not None else shard_max_tokens
+    pdf_page_range = args.pdf_pages if args.pdf_pages is not None else pdf_page_range
+    pdf_max_pages = args.pdf_max_pages if args.pdf_max_pages is not None else pdf_max_pages
+    stats_per_file = args.stats_per_file if args.stats_per_file is not None else stats_per_file
+    profile_mode = args.profile if args.profile is not None else profile_mode
+    return args
 
 def main():
+    from rich.panel import Panel
+    from rich.progress import Progress, TextColumn, BarColumn, TimeRemainingColumn
+    from rich.prompt import Prompt
+    from rich.text import Text
+
     intro_text = Text("Specify a local path or supported URL type\n", style="bright_white")
     src_options = [
         ("▫️ Local Directory (full path)", "pale_green3"),
@@ -658,8 +3002,12 @@ def main():
     )
     console.print(intro_panel, new_line_start=True)
 
-    if len(sys.argv) > 1:
-        input_path = sys.argv[1]
+    args = parse_args()
+    if args.batch:
+        run_batch(read_batch_inputs(args.batch), "output", args.incremental)
+        return
+    if args.input_path:
+        input_path = args.input_path
     else:
         input_path = Prompt.ask(
             "\n[bold dodger_blue1]Enter path or URL[/bold dodger_blue1]",
@@ -671,11 +3019,6 @@ def main():
     )
 
     output_dir = "output"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    output_file = os.path.join(output_dir, "uncompressed.output.txt")
-    urls_list_file = os.path.join(output_dir, "processed_urls.txt")
-
     with Progress(
         TextColumn("[bold bright_blue]{task.description}"),
         BarColumn(bar_width=None),
@@ -684,76 +3027,228 @@ def main():
     ) as progress:
         task = progress.add_task("[bright_blue]Processing...", total=100)
         set_filters()
+        summary, uncompressed_counter = run_input(input_path, output_dir, args.incremental, profile=True)
+        progress.update(task, advance=100)
 
-        if "github.com" in input_path:
-            if "/pull/" in input_path:
-                final_output = process_github_pull_request(input_path, output_file)
-            elif "/issues/" in input_path:
-                final_output = process_github_issue(input_path, output_file)
-            else:
-                repo_content = process_github_repo(input_path)
-                with open(output_file, "w", encoding="utf-8") as file:
-                    file.write(repo_content)
-                final_output = repo_content
-        elif urlparse(input_path).scheme in ["http", "https"]:
-            if "youtube.com" in input_path or "youtu.be" in input_path:
-                transcript = fetch_youtube_transcript(input_path)
-                if transcript:
-                    with open(output_file, "w", encoding="utf-8") as output:
-                        output.write(f"# YouTube Video Transcript\n")
-                        output.write(f"# URL: {input_path}\n\n")
-                        output.write(transcript)
-                    console.print(
-                        "[bright_green]YouTube video transcript processed.[/bright_green]"
-                    )
-                else:
-                    console.print(
-                        "[bright_yellow]No transcript available for the YouTube video.[/bright_yellow]"
-                    )
-            elif "arxiv.org" in input_path:
-                process_arxiv_pdf(input_path, output_file)
-            else:
-                final_output = crawl_and_extract_text(
-                    input_path,
-                    output_file,
-                    urls_list_file,
-                    max_depth=2,
-                    include_pdfs=True,
-                    ignore_epubs=True,
-                )
-        elif input_path.startswith("10.") and "/" in input_path or input_path.isdigit():
-            process_doi_or_pmid(input_path, output_file)
-        else:
-            process_local_folder(input_path, output_file)
-
-        progress.update(task, advance=50)
-
-        compressed_output_file = os.path.join(output_dir, "compressed.output.txt")
-        preprocess_text(output_file, compressed_output_file)
-
-        progress.update(task, advance=50)
+    if summary["shards"] is not None:
+        console.print(
+            f"[bold dark_sea_green4]Shards:[/bold dark_sea_green4] {summary['shards']} in `./output/shards`, "
+            f"index in {os.path.join(output_dir, 'manifest.json')}"
+        )
 
-    compressed_text = safe_file_read(compressed_output_file)
-    compressed_token_count = get_token_count(compressed_text)
     console.print(
-        f"\n[bold chartreuse1]Compressed Token Count:[/bold chartreuse1] [orchid]{compressed_token_count}[/orchid]"
+        f"\n[bold chartreuse1]Compressed Token Count:[/bold chartreuse1] [orchid]{summary['tokens']['compressed']}[/orchid]"
     )
-
-    uncompressed_text = safe_file_read(output_file)
-    uncompressed_token_count = get_token_count(uncompressed_text)
     console.print(
-        f"[bold dark_sea_green4]Uncompressed Token Count:[/bold dark_sea_green4] [orchid]{uncompressed_token_count}[/orchid]"
+        f"[bold dark_sea_green4]Uncompressed Token Count:[/bold dark_sea_green4] [orchid]{summary['tokens']['uncompressed']}[/orchid]"
     )
 
+    print_token_breakdown(uncompressed_counter)
+
     console.print(
         f"\n[bold bright_white]`compressed.output.txt`[/bold bright_white] & [bold bright_white]`uncompressed.output.txt`[/bold bright_white] have been created in `./output`.\n"
     )
 
+    http_cache = summary["http_cache"]
+    if any(http_cache.values()):
+        console.print(
+            f"[bold dark_sea_green4]HTTP Cache:[/bold dark_sea_green4] {http_cache['fresh']} fresh, "
+            f"{http_cache['revalidated']} revalidated, {http_cache['downloaded']} downloaded"
+        )
+    console.print(f"[bold dark_sea_green4]Run statistics:[/bold dark_sea_green4] {summary['stats_file']}")
+
     if enable_clipboard:
-        pyperclip.copy(uncompressed_text)
+        import pyperclip
+
+        output_file = summary["output_file"]
+        pyperclip.copy(safe_file_read(output_file))
         console.print(
             f"[bright_yellow]The contents of [bold bright_blue]{output_file}[/bold bright_blue] have been copied to the clipboard.[/bright_yellow]\n"
         )
 
+def run_input(input_path, output_dir, incremental=False, profile=False):
+    # One input end to end under its own RunStats: both outputs, shards and stats.json in output_dir.
+    # Returns a summary of the run and the uncompressed token counter
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, "uncompressed.output.txt")
+    urls_list_file = os.path.join(output_dir, "processed_urls.txt")
+    compressed_output_file = os.path.join(output_dir, "compressed.output.txt")
+    manifest_file = os.path.join(output_dir, "local_manifest.json") if incremental else None
+    crawl_state_file = os.path.join(output_dir, "crawl_state.sqlite")
+    stats_file = os.path.join(output_dir, "stats.json")
+
+    stats = RunStats()
+    context_token = current_run_stats.set(stats)
+    try:
+        uncompressed_counter = TokenCounter()
+        compressed_counter = TokenCounter()
+        compressor = TextCompressor(compressed_output_file, [compressed_counter])
+        profiler = start_profiler() if profile else None
+        run_start = time.perf_counter()
+
+        shards = None
+        if shard_max_bytes or shard_max_tokens:
+            shards = ShardWriter(
+                os.path.join(output_dir, "shards"),
+                os.path.join(output_dir, "manifest.json"),
+                uncompressed_counter,
+                output_file,
+                shard_max_bytes,
+                shard_max_tokens,
+            )
+        with OutputSink(output_file, [uncompressed_counter, compressor], shards) as output:
+            process_input(input_path, output, urls_list_file, manifest_file, crawl_state_file)
+
+        wall_seconds = time.perf_counter() - run_start
+        run_profile = stop_profiler(profiler, output_dir) if profile else None
+        write_run_stats(stats_file, input_path, wall_seconds, output, uncompressed_counter, compressed_counter, run_profile)
+    finally:
+        current_run_stats.reset(context_token)
+
+    summary = {
+        "input": input_path,
+        "handler": stats.handler,
+        "output_dir": output_dir,
+        "output_file": output_file,
+        "stats_file": stats_file,
+        "wall_s": round(wall_seconds, 3),
+        "tokens": {"uncompressed": uncompressed_counter.total, "compressed": compressed_counter.total},
+        "http_cache": dict(stats.http_cache),
+        "shards": output.shard_count,
+    }
+    return summary, uncompressed_counter
+
+def read_batch_inputs(batch_file):
+    # One input per line from a file, or from stdin for "-"; blank lines and "#" comments are skipped
+    if batch_file == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(batch_file, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+
+def batch_output_dir(output_root, index, input_path):
+    slug = re.sub(r"[^\w.-]+", "_", input_path.split("://", 1)[-1]).strip("_.")[:80]
+    return os.path.join(output_root, f"{index:03d}_{slug or 'input'}")
+
+def run_batch(inputs, output_root, incremental=False):
+    # Runs many inputs on batch_workers threads in one process. They share the HTTP session, per-host
+    # limits and the on-disk caches; each writes its own output directory and stats.json, and a failing
+    # input is recorded in the summary without stopping the others
+    set_filters()
+    batch_start = time.perf_counter()
+
+    def run_one(index, input_path):
+        output_dir = batch_output_dir(output_root, index, input_path)
+        start = time.perf_counter()
+        try:
+            summary, _ = run_input(input_path, output_dir, incremental)
+        except Exception as e:
+            console.print(f"Failed: {input_path} ({type(e).__name__}: {e})", style="bold red")
+            return {
+                "input": input_path,
+                "output_dir": output_dir,
+                "status": "error",
+                "error": f"{type(e).__name__}: {e}",
+                "wall_s": round(time.perf_counter() - start, 3),
+            }
+        console.print(f"Done: {input_path} -> {output_dir}", style="bold green")
+        return dict(summary, status="ok")
+
+    with ContextThreadPool(max_workers=batch_workers) as executor:
+        runs = list(executor.map(run_one, range(1, len(inputs) + 1), inputs))
+
+    succeeded = [run for run in runs if run["status"] == "ok"]
+    summary = {
+        "inputs": len(inputs),
+        "succeeded": len(succeeded),
+        "failed": len(runs) - len(succeeded),
+        "wall_s": round(time.perf_counter() - batch_start, 3),
+        "input_wall_s": round(sum(run["wall_s"] for run in runs), 3),
+        "tokens": {
+            "uncompressed": sum(run["tokens"]["uncompressed"] for run in succeeded),
+            "compressed": sum(run["tokens"]["compressed"] for run in succeeded),
+        },
+        # Inputs that failed have no stats to add
+        "http_cache": {
+            kind: sum(run["http_cache"][kind] for run in succeeded) for kind in ("fresh", "revalidated", "downloaded")
+        },
+        "runs": runs,
+    }
+    summary_file = os.path.join(output_root, "batch_summary.json")
+    write_cache_file(summary_file, json.dumps(summary, indent=2).encode("utf-8"))
+    print_batch_summary(summary, summary_file)
+    return summary
+
+def print_batch_summary(summary, summary_file):
+    from rich.table import Table
+
+    table = Table(title="Batch Summary", title_style="bold chartreuse1", header_style="bold sky_blue1")
+    table.add_column("Input", style="royal_blue1", overflow="fold")
+    table.add_column("Handler", style="pale_green3")
+    table.add_column("Seconds", justify="right")
+    table.add_column("Tokens", justify="right", style="orchid")
+    table.add_column("Compressed", justify="right", style="orchid")
+    for run in summary["runs"]:
+        if run["status"] == "ok":
+            tokens = run["tokens"]
+            table.add_row(run["input"], run["handler"], f"{run['wall_s']:.2f}", f"{tokens['uncompressed']:,}", f"{tokens['compressed']:,}")
+        else:
+            table.add_row(run["input"], f"[bold red]{run['error']}[/bold red]", f"{run['wall_s']:.2f}", "-", "-")
+    console.print(table)
+    console.print(
+        f"[bold dark_sea_green4]Batch:[/bold dark_sea_green4] {summary['succeeded']} of {summary['inputs']} inputs in "
+        f"{summary['wall_s']:.2f}s ({summary['input_wall_s']:.2f}s of input time), "
+        f"{summary['tokens']['uncompressed']:,} tokens ({summary['tokens']['compressed']:,} compressed); {summary_file}"
+    )
+
+def process_input(input_path, output, urls_list_file, manifest_file=None, crawl_state_file=None):
+    if "github.com" in input_path:
+        if "/pull/" in input_path:
+            run_stats.handler = "github_pull_request"
+            write_github_pull_request(input_path, output)
+        elif "/issues/" in input_path:
+            run_stats.handler = "github_issue"
+            write_github_issue(input_path, output)
+        else:
+            run_stats.handler = "github_repo"
+            process_github_repo(input_path, output)
+    elif urlparse(input_path).scheme in ["http", "https"]:
+        if "youtube.com" in input_path or "youtu.be" in input_path:
+            run_stats.handler = "youtube"
+            transcript = fetch_youtube_transcript(input_path)
+            if transcript:
+                output.write(f"# YouTube Video Transcript\n")
+                output.write(f"# URL: {input_path}\n\n")
+                output.write(transcript)
+                console.print(
+                    "[bright_green]YouTube video transcript processed.[/bright_green]"
+                )
+            else:
+                console.print(
+                    "[bright_yellow]No transcript available for the YouTube video.[/bright_yellow]"
+                )
+        elif "arxiv.org" in input_path:
+            run_stats.handler = "arxiv"
+            write_arxiv_pdf(input_path, output)
+        else:
+            run_stats.handler = "crawl"
+            write_crawled_text(
+                input_path,
+                output,
+                urls_list_file,
+                max_depth=crawl_max_depth,
+                include_pdfs=True,
+                ignore_epubs=True,
+                state_file=crawl_state_file,
+            )
+    elif input_path.startswith("10.") and "/" in input_path or input_path.isdigit():
+        run_stats.handler = "doi"
+        write_doi_or_pmid(input_path, output)
+    else:
+        run_stats.handler = "local"
+        process_local_directory(input_path, output, manifest_file)
+        console.print("\nAll files processed.\n", style="bold green")
+
 if __name__ == "__main__":
     main()
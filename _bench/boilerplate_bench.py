@@ -0,0 +1,80 @@
+# Times the cross-page boilerplate filter in 1file.py on synthetic crawled pages and checks what it removes:
+# navigation and "Last updated on <date>" footers should go, while body lines that are unique to their page
+# but share a common phrase ("in order to") must all be kept
+#
+#   python _bench/boilerplate_bench.py [--pages 2000] [--lines 40]
+
+import argparse
+import contextlib
+import io
+import random
+import time
+
+from common import load_onefile, report
+
+NAV_LINES = ["Home", "Docs", "Guides", "API reference", "Blog", "Search"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+WORDS = [
+    "the", "server", "client", "request", "cache", "token", "parser", "module", "option", "value", "config",
+    "returns", "handles", "each", "file", "page", "before", "after", "with", "without", "every", "new",
+]
+
+def body_line(rng, page, index):
+    # Distinct on every page; about half of them share the phrase "in order to"
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 14))]
+    if rng.random() < 0.5:
+        at = rng.randint(0, len(words))
+        words[at:at] = ["in", "order", "to"]
+    return " ".join(words + [f"p{page}l{index}"])
+
+def footer_line(rng):
+    return (
+        f"Last updated on {rng.choice(MONTHS)} {rng.randint(1, 28)}, {rng.randint(2015, 2025)} "
+        f"by the documentation team. Edit this page on GitHub"
+    )
+
+def generate_pages(pages, lines):
+    rng = random.Random(1)
+    texts, body = [], set()
+    for page in range(pages):
+        page_lines = [body_line(rng, page, index) for index in range(lines)]
+        body.update(page_lines)
+        texts.append("\n".join(NAV_LINES + page_lines + [footer_line(rng)]))
+    return texts, body
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--lines", type=int, default=40)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        onefile = load_onefile()
+    onefile.console.quiet = True
+    texts, body = generate_pages(args.pages, args.lines)
+
+    start = time.perf_counter()
+    boilerplate = onefile.BoilerplateFilter()
+    for text in texts:
+        boilerplate.add_page(text)
+    boilerplate.finish()
+    classify_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stripped = [boilerplate.strip(text) for text in texts]
+    strip_seconds = time.perf_counter() - start
+
+    kept_lines = {line for text in stripped for line in text.splitlines()}
+    report({
+        "pages": args.pages,
+        "body_lines": len(body),
+        "classify_seconds": round(classify_seconds, 3),
+        "strip_seconds": round(strip_seconds, 3),
+        "pages_per_s": round(args.pages / (classify_seconds + strip_seconds), 1),
+        "body_lines_removed": len(body - kept_lines),
+        "pages_with_footer": sum("Last updated on" in text for text in stripped),
+        "pages_with_nav": sum(any(line in NAV_LINES for line in text.splitlines()) for text in stripped),
+    })
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import importlib
+import json
+import os
+import resource
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_onefile():
+    # "import 1file" is not valid syntax, but importlib takes the name. Importing it by its file name lets
+    # spawned PDF pool workers import the same module
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    return importlib.import_module("1file")
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_worker(script, *args):
+    # Each measurement runs in a fresh interpreter so peak RSS is not polluted by earlier runs
+    result = subprocess.run(
+        [sys.executable, script, "--worker", *map(str, args)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def emit(result):
+    # Workers print one compact JSON line as their last line of output
+    print(json.dumps(result))
+
+def report(results):
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,93 @@
+# Compares the streaming compressor in 1file.py with the original whole-file preprocess_text
+#
+#   python _bench/compress_bench.py [--size-mb 200]
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+from common import emit, load_onefile, peak_rss_mb, report, run_worker
+
+WORDS = [
+    "the", "and", "def", "return", "self", "import", "value", "Config", "parser", "token",
+    "résumé", "naïve", "日本語", "{", "}", "(x)", "->", "==", "#", "//", "0x1F", "42", "it's",
+]
+
+def generate_corpus(path, size_mb):
+    rng = random.Random(1)
+    target = size_mb * 1024 * 1024
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 24)))
+            line += rng.choice(["\n", "\n", "\r\n", "\n\n", "\t\n"])
+            f.write(line)
+            written += len(line)
+
+def legacy_preprocess_text(input_file, output_file, stop_words):
+    with open(input_file, "r", encoding="utf-8") as source:
+        input_text = source.read()
+
+    text = re.sub(r"[\n\r]+", "\n", input_text)
+    text = re.sub(r"[^a-zA-Z0-9\s_.,!?:;@#$%^&*()+\-=[\]{}|\\<>`~'\"/]+", "", text)
+    text = re.sub(r"\s+", " ", text)
+    text = text.lower()
+
+    words = text.split()
+    words = [word for word in words if word not in stop_words]
+    text = " ".join(words)
+
+    with open(output_file, "w", encoding="utf-8") as target:
+        target.write(text.strip())
+
+def worker(implementation, input_file, output_file):
+    with contextlib.redirect_stdout(io.StringIO()):
+        onefile = load_onefile()
+    baseline_rss = peak_rss_mb()
+
+    start = time.perf_counter()
+    if implementation == "legacy":
+        legacy_preprocess_text(input_file, output_file, onefile.get_stop_words())
+    else:
+        onefile.preprocess_text(input_file, output_file)
+    elapsed = time.perf_counter() - start
+
+    size_mb = os.path.getsize(input_file) / (1024 * 1024)
+    emit({
+        "implementation": implementation,
+        "seconds": round(elapsed, 3),
+        "mb_per_s": round(size_mb / elapsed, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rss_above_import_mb": round(peak_rss_mb() - baseline_rss, 1),
+    })
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus = os.path.join(temp_dir, "corpus.txt")
+        generate_corpus(corpus, args.size_mb)
+
+        results = {"input_mb": args.size_mb, "runs": []}
+        outputs = {}
+        for implementation in ("legacy", "streaming"):
+            outputs[implementation] = os.path.join(temp_dir, f"{implementation}.txt")
+            results["runs"].append(run_worker(__file__, implementation, corpus, outputs[implementation]))
+
+        with open(outputs["legacy"], "rb") as legacy, open(outputs["streaming"], "rb") as streaming:
+            results["byte_identical"] = legacy.read() == streaming.read()
+        report(results)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(*sys.argv[2:])
+    else:
+        main()
@@ -0,0 +1,444 @@
+# Synthetic corpora and local stand-ins for the network sources used by suite.py: a local source tree,
+# a multi-level HTML docs site served by http.server, a fake GitHub REST API and generated PDFs
+
+import gzip
+import hashlib
+import http.server
+import io
+import json
+import os
+import random
+import tarfile
+import threading
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlencode, urlparse
+
+# (extension, weight, median size in bytes); excluded and non-allowed types are included on purpose
+EXTENSION_MIX = [
+    (".py", 30, 4000), (".js", 10, 5000), (".ts", 8, 4000), (".tsx", 4, 3000), (".md", 8, 3000),
+    (".json", 6, 2000), (".html", 3, 6000), (".css", 3, 3000), (".c", 3, 8000), (".h", 2, 1500),
+    (".rs", 3, 6000), (".txt", 3, 2000), (".yaml", 3, 800), (".toml", 2, 600), (".sh", 2, 900),
+    (".sql", 1, 1500), (".ipynb", 2, 12000), (".png", 3, 20000), (".lock", 1, 40000), (".min.js", 1, 60000),
+]
+DIRECTORY_NAMES = ["src", "lib", "core", "utils", "api", "docs", "tests", "models", "views", "scripts", "config"]
+EXCLUDED_DIRECTORIES = ["node_modules", "__pycache__", "dist", ".venv"]
+WORDS = [
+    "the", "value", "config", "parser", "request", "token", "cache", "handler", "result", "index", "user",
+    "update", "return", "stream", "buffer", "error", "default", "options", "client", "server", "render",
+]
+CODE_LINES = {
+    ".py": ["def {w}_{v}(self, {w}):", "    return self.{w}.get({v!r})", "import {w}", "{w} = {v}({w})", "    pass", ""],
+    ".js": ["function {w}({v}) {{", "  return {v}.{w};", "}}", "const {w} = require('{v}');", ""],
+    ".ts": ["export function {w}({v}: string): number {{", "  return {v}.length;", "}}", "import {{ {w} }} from './{v}';"],
+    ".c": ["int {w}_{v}(int {w}) {{", "    return {w} + 1;", "}}", "#include <{w}.h>", ""],
+    ".rs": ["fn {w}_{v}({w}: &str) -> usize {{", "    {w}.len()", "}}", "use crate::{w}::{v};", ""],
+}
+
+def random_text(rng, size, extension):
+    lines = CODE_LINES.get(extension)
+    parts = []
+    written = 0
+    while written < size:
+        w, v = rng.choice(WORDS), rng.choice(WORDS)
+        if lines:
+            line = rng.choice(lines).format(w=w, v=v)
+        else:
+            line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 16)))
+        parts.append(line)
+        written += len(line) + 1
+    return "\n".join(parts) + "\n"
+
+def notebook_text(rng, size):
+    cells = []
+    while sum(len(cell["source"]) for cell in cells) < size:
+        source = random_text(rng, rng.randint(100, 800), ".py")
+        cells.append({"cell_type": "code", "execution_count": len(cells) + 1, "metadata": {}, "outputs": [], "source": source})
+    return json.dumps({"cells": cells, "metadata": {}, "nbformat": 4, "nbformat_minor": 5})
+
+def file_content(rng, extension, median):
+    size = max(64, int(rng.lognormvariate(0, 0.8) * median))
+    if extension == ".png":
+        return b"\x89PNG\r\n\x1a\n" + rng.randbytes(size)
+    if extension == ".ipynb":
+        return notebook_text(rng, size).encode("utf-8")
+    if extension == ".min.js":
+        return ";".join(f"var {rng.choice(WORDS)}{i}={i}" for i in range(size // 12)).encode("utf-8")
+    return random_text(rng, size, extension).encode("utf-8")
+
+def generate_tree(root, files, seed=1):
+    # Writes `files` files in a nested directory layout and returns their total size in bytes
+    rng = random.Random(seed)
+    extensions = [extension for extension, _, _ in EXTENSION_MIX]
+    weights = [weight for _, weight, _ in EXTENSION_MIX]
+    medians = {extension: median for extension, _, median in EXTENSION_MIX}
+    directories = [""]
+    total = 0
+    for index in range(files):
+        if rng.random() < 0.08:
+            parent = rng.choice(directories)
+            name = rng.choice(EXCLUDED_DIRECTORIES) if rng.random() < 0.1 else f"{rng.choice(DIRECTORY_NAMES)}{len(directories)}"
+            directories.append(f"{parent}/{name}".strip("/"))
+        directory = rng.choice(directories)
+        extension = rng.choices(extensions, weights)[0]
+        path = os.path.join(root, directory, f"{rng.choice(WORDS)}_{index}{extension}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = file_content(rng, extension, medians[extension])
+        with open(path, "wb") as f:
+            f.write(data)
+        total += len(data)
+    with open(os.path.join(root, ".gitignore"), "w", encoding="utf-8") as f:
+        f.write("*.lock\n*.min.js\n")
+    return total
+
+def make_pdf(pages):
+    # Minimal uncompressed PDF with one Helvetica text stream per page
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    def escape(line):
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("latin-1")
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids = []
+    content_ids = []
+    for text in pages:
+        stream = b"BT /F1 11 Tf 50 750 Td 14 TL " + b" ".join(b"(" + escape(line) + b") '" for line in text.split("\n")) + b" ET"
+        content_ids.append(add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"))
+        page_ids.append(add(None))
+    pages_id = add(None)
+    for content_id, page_id in zip(content_ids, page_ids):
+        objects[page_id - 1] = (
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, content_id, font)
+        )
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % p for p in page_ids) + b"] /Count %d >>" % len(page_ids)
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
+
+def generate_pdf(path, pages, seed=1):
+    rng = random.Random(seed)
+    texts = ["\n".join(" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(40)) for _ in range(pages)]
+    data = make_pdf(texts)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+def generate_site(root, depth, fanout, pdfs=2, seed=1):
+    # Writes a docs site under root/docs: every page links to its children, parent and siblings, and repeats
+    # the same navigation and footer, like generated documentation does
+    rng = random.Random(seed)
+    site_root = os.path.join(root, "docs")
+    nav = "".join(f'<a href="/docs/section{i}/index.html">Section {i}</a> ' for i in range(fanout))
+    page_count = 0
+
+    def write_page(rel_dir, level):
+        nonlocal page_count
+        directory = os.path.join(site_root, rel_dir)
+        os.makedirs(directory, exist_ok=True)
+        children = [f"section{i}" if level == 0 else f"page{i}" for i in range(fanout)] if level < depth else []
+        links = "".join(f'<li><a href="{child}/index.html#top">{child}</a></li>' for child in children)
+        links += '<li><a href="../index.html">Up</a></li><li><a href="./index.html?utm_source=nav">Self</a></li>'
+        if level == depth:
+            links += "".join(f'<li><a href="/docs/files/manual{i}.pdf">Manual {i}</a></li>' for i in range(pdfs))
+        paragraphs = "".join(
+            f"<p>{' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 80)))}</p>" for _ in range(rng.randint(3, 10))
+        )
+        html = (
+            f"<!DOCTYPE html><html><head><title>{rel_dir or 'Home'}</title><style>body{{margin:0}}</style>"
+            f"<script>var analytics = 1;</script></head><body><nav>{nav}</nav>"
+            f"<main><h1>{rel_dir or 'Home'}</h1>{paragraphs}<ul>{links}</ul></main>"
+            f"<!-- generated --><footer>Copyright Example Docs. Built with a docs generator.</footer></body></html>"
+        )
+        with open(os.path.join(directory, "index.html"), "w", encoding="utf-8") as f:
+            f.write(html)
+        page_count += 1
+        for child in children:
+            write_page(f"{rel_dir}/{child}".strip("/"), level + 1)
+
+    write_page("", 0)
+    os.makedirs(os.path.join(site_root, "files"), exist_ok=True)
+    for i in range(pdfs):
+        generate_pdf(os.path.join(site_root, "files", f"manual{i}.pdf"), pages=8, seed=seed + i)
+    return page_count
+
+def write_sitemaps(root, site_url, children=2):
+    # robots.txt pointing at a sitemap index whose gzipped child sitemaps list every page of the docs site,
+    # with each page's modification time as lastmod. Needs the served URL, so it runs once the server is up
+    pages = []
+    for dir_path, dir_names, file_names in os.walk(os.path.join(root, "docs")):
+        dir_names.sort()
+        for name in sorted(file_names):
+            path = os.path.join(dir_path, name)
+            url = f"{site_url}/{os.path.relpath(path, root).replace(os.sep, '/')}"
+            lastmod = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            pages.append(f"<url><loc>{url}</loc><lastmod>{lastmod}</lastmod></url>")
+
+    namespace = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+    index = []
+    for child in range(children):
+        entries = "".join(pages[child::children])
+        with gzip.open(os.path.join(root, f"sitemap{child}.xml.gz"), "wt", encoding="utf-8") as f:
+            f.write(f'<?xml version="1.0" encoding="UTF-8"?><urlset {namespace}>{entries}</urlset>')
+        index.append(f"<sitemap><loc>{site_url}/sitemap{child}.xml.gz</loc></sitemap>")
+    with open(os.path.join(root, "sitemap_index.xml"), "w", encoding="utf-8") as f:
+        f.write(f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex {namespace}>{"".join(index)}</sitemapindex>')
+    with open(os.path.join(root, "robots.txt"), "w", encoding="utf-8") as f:
+        f.write(f"User-agent: *\nAllow: /\n\nSitemap: {site_url}/sitemap_index.xml\n")
+    return len(pages)
+
+class CountingServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, handler):
+        super().__init__(address, handler)
+        self.requests = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+    def count(self, sent):
+        with self.lock:
+            self.requests += 1
+            self.bytes_sent += sent
+
+    def counters(self):
+        with self.lock:
+            return self.requests, self.bytes_sent
+
+def serve(handler, **attributes):
+    # Starts a server on a free localhost port in a daemon thread and returns it
+    handler = type(handler.__name__, (handler,), attributes)
+    server = CountingServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    return server
+
+class SiteHandler(http.server.SimpleHTTPRequestHandler):
+    # Static files from `directory`; served byte counts come from the file sizes
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=self.site_directory, **kwargs)
+
+    def send_head(self):
+        result = super().send_head()
+        path = self.translate_path(self.path)
+        self.server.count(os.path.getsize(path) if result and os.path.isfile(path) else 0)
+        return result
+
+    def log_message(self, format, *args):
+        pass
+
+def git_blob_sha(data):
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+class FakeGitHub:
+    # In-memory repository plus a pull request and an issue, served in the shape of the GitHub REST API
+    def __init__(self, tree_root, owner="bench", repo="repo", diff_files=40, diff_lines=250, comments=120, seed=1):
+        rng = random.Random(seed)
+        self.owner = owner
+        self.repo = repo
+        self.files = {}
+        for dir_path, dir_names, file_names in os.walk(tree_root):
+            dir_names.sort()
+            for name in sorted(file_names):
+                path = os.path.join(dir_path, name)
+                with open(path, "rb") as f:
+                    self.files[os.path.relpath(path, tree_root).replace(os.sep, "/")] = f.read()
+        self.blobs = {git_blob_sha(data): data for data in self.files.values()}
+
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+            for path, data in self.files.items():
+                member = tarfile.TarInfo(f"{owner}-{repo}-0000000/{path}")
+                member.size = len(data)
+                archive.addfile(member, io.BytesIO(data))
+        self.tarball = buffer.getvalue()
+
+        self.diff, self.review_comments = self.generate_pull_request(rng, diff_files, diff_lines, comments)
+        # A quarter of the comments link line ranges of a handful of files, as issue discussions do
+        linked_paths = sorted(self.files)[:5]
+        self.issue_comments = [
+            {"id": i, "user": {"login": f"user{i % 7}"}, "body": " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 60)))}
+            for i in range(comments)
+        ]
+        for comment in self.issue_comments[::4]:
+            start = rng.randint(1, 20)
+            link = f"https://github.com/{owner}/{repo}/blob/main/{rng.choice(linked_paths)}#L{start}-L{start + rng.randint(0, 10)}"
+            comment["body"] += f" See {link}"
+
+    def generate_pull_request(self, rng, diff_files, diff_lines, comments):
+        # Lines repeat across hunks on purpose ("+    pass", blank context), as they do in real diffs. Review
+        # positions follow GitHub: lines below the first "@@" of a file count from 1, later "@@" lines included
+        lines = []
+        targets = []
+        paths = sorted(self.files)[:diff_files]
+        for path in paths:
+            lines += [f"diff --git a/{path} b/{path}", "index 0000000..1111111 100644", f"--- a/{path}", f"+++ b/{path}"]
+            position = None
+            while (position or 0) < diff_lines:
+                start = rng.randint(1, 500)
+                lines.append(f"@@ -{start},7 +{start},8 @@")
+                hunk_start = len(lines) - 1
+                position = 0 if position is None else position + 1
+                for _ in range(rng.randint(6, 20)):
+                    lines.append(rng.choice(" +-  ") + rng.choice(["    pass", "", "    return value", f"    {rng.choice(WORDS)} = {rng.randint(0, 9)}"]))
+                    position += 1
+                    targets.append((path, position, "\n".join(lines[hunk_start:])))
+        review_comments = [
+            {
+                "id": i,
+                "user": {"login": f"reviewer{i % 5}"},
+                "body": " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 30))),
+                "path": path,
+                "position": position,
+                "original_line": rng.randint(1, 500),
+                "diff_hunk": diff_hunk,
+            }
+            for i, (path, position, diff_hunk) in enumerate(sorted(rng.sample(targets, min(comments, len(targets)))))
+        ]
+        return "\n".join(lines) + "\n", review_comments
+
+    def pull_request(self, base):
+        repo = f"{base}/repos/{self.owner}/{self.repo}"
+        return {
+            "number": 1,
+            "title": "Benchmark pull request",
+            "body": "Synthetic pull request for the benchmark suite.",
+            "user": {"login": "author"},
+            "commits": 3,
+            "base": {"ref": "main"},
+            "head": {"label": "author:feature"},
+            "diff_url": f"{base}/{self.owner}/{self.repo}/pull/1.diff",
+            "comments_url": f"{repo}/issues/1/comments",
+            "review_comments_url": f"{repo}/pulls/1/comments",
+        }
+
+    def issue(self, base):
+        return {
+            "number": 2,
+            "title": "Benchmark issue",
+            "body": f"Synthetic issue for the benchmark suite, see https://github.com/{self.owner}/{self.repo}/blob/main/{sorted(self.files)[0]}#L3",
+            "user": {"login": "author"},
+            "comments_url": f"{base}/repos/{self.owner}/{self.repo}/issues/2/comments",
+        }
+
+    def contents(self, base, directory):
+        prefix = f"{directory}/" if directory else ""
+        entries = {}
+        for path in self.files:
+            if not path.startswith(prefix):
+                continue
+            name, _, rest = path[len(prefix):].partition("/")
+            entries[name] = "dir" if rest else "file"
+        if not entries:
+            return None
+        listing = []
+        for name, kind in sorted(entries.items()):
+            path = prefix + name
+            listing.append({
+                "name": name,
+                "path": path,
+                "type": kind,
+                "url": f"{base}/repos/{self.owner}/{self.repo}/contents/{path}",
+                "download_url": f"{base}/raw/{self.owner}/{self.repo}/main/{path}" if kind == "file" else None,
+            })
+        return listing
+
+    def tree(self):
+        return {
+            "sha": "0000000",
+            "truncated": False,
+            "tree": [{"path": path, "type": "blob", "sha": git_blob_sha(data), "size": len(data)} for path, data in self.files.items()],
+        }
+
+class GitHubHandler(http.server.BaseHTTPRequestHandler):
+    # Routes the endpoints 1file.py uses; list endpoints paginate with per_page/page and a Link header
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        github = self.github
+        base = self.server.url
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        parts = parsed.path.strip("/").split("/")
+        repo = f"repos/{github.owner}/{github.repo}"
+        path = parsed.path.strip("/")
+
+        if path == repo:
+            return self.send_json({"default_branch": "main", "full_name": f"{github.owner}/{github.repo}"})
+        if path.startswith(f"{repo}/tarball"):
+            return self.send(github.tarball, "application/gzip")
+        if path.startswith(f"{repo}/git/trees/"):
+            return self.send_json(github.tree())
+        if path.startswith(f"{repo}/git/blobs/"):
+            data = github.blobs.get(parts[-1])
+            return self.send(data, "application/vnd.github.raw") if data is not None else self.send_error(404)
+        if path == f"{repo}/contents" or path.startswith(f"{repo}/contents/"):
+            file_path = path[len(f"{repo}/contents"):].strip("/")
+            if file_path in github.files and "ref" in query:
+                return self.send(github.files[file_path], "application/vnd.github.raw")
+            listing = github.contents(base, file_path)
+            return self.send_json(listing) if listing is not None else self.send_error(404)
+        if path.startswith(f"raw/{github.owner}/{github.repo}/"):
+            data = github.files.get(path.split("/", 4)[-1])
+            return self.send(data, "text/plain") if data is not None else self.send_error(404)
+        if path == f"{repo}/pulls/1":
+            if "diff" in self.headers.get("Accept", ""):
+                return self.send(github.diff.encode("utf-8"), "application/vnd.github.diff; charset=utf-8")
+            return self.send_json(github.pull_request(base))
+        if path == f"{github.owner}/{github.repo}/pull/1.diff":
+            return self.send(github.diff.encode("utf-8"), "text/plain")
+        if path == f"{repo}/pulls/1/comments":
+            return self.send_page(github.review_comments, query)
+        if path in (f"{repo}/issues/1/comments", f"{repo}/issues/2/comments"):
+            return self.send_page(github.issue_comments, query)
+        if path == f"{repo}/issues/2":
+            return self.send_json(github.issue(base))
+        self.send_error(404)
+
+    def send_page(self, items, query):
+        per_page = min(int(query.get("per_page", ["30"])[0]), 100)
+        page = int(query.get("page", ["1"])[0])
+        last = max(1, -(-len(items) // per_page))
+        links = []
+        url = f"{self.server.url}{urlparse(self.path).path}"
+        if page < last:
+            links.append(f'<{url}?{urlencode({"per_page": per_page, "page": page + 1})}>; rel="next"')
+            links.append(f'<{url}?{urlencode({"per_page": per_page, "page": last})}>; rel="last"')
+        headers = {"Link": ", ".join(links)} if links else {}
+        self.send_json(items[(page - 1) * per_page : page * per_page], headers)
+
+    def send_json(self, value, headers=None):
+        self.send(json.dumps(value).encode("utf-8"), "application/json", headers)
+
+    def send(self, data, content_type, headers=None):
+        if self.headers.get("Accept-Encoding", "").find("gzip") >= 0 and content_type == "application/json":
+            data = gzip.compress(data)
+            headers = dict(headers or {}, **{"Content-Encoding": "gzip"})
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.count(len(data))
+
+    def send_error(self, code, message=None, explain=None):
+        self.server.count(0)
+        super().send_error(code, message, explain)
+
+    def log_message(self, format, *args):
+        pass
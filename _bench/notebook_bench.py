@@ -0,0 +1,112 @@
+# Compares the built-in notebook extractor in 1file.py with nbconvert's PythonExporter on a synthetic corpus
+#
+#   python _bench/notebook_bench.py [--notebooks 200] [--cells 40]
+
+import argparse
+import base64
+import contextlib
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from common import emit, load_onefile, peak_rss_mb, report, run_worker
+
+CODE_LINES = [
+    "import numpy as np", "df = load_frame(path)", "for i in range(10):\n    total += i",
+    "def f(x):\n    return x * 2", "print(df.head())", "%matplotlib inline", "!pip list", "result = !ls",
+    "model.fit(X, y)", "assert total == 45", "plt.plot(xs, ys)",
+]
+MARKDOWN_LINES = ["# Analysis", "Some *notes* about the data.", "- point one\n- point two", "", "$$x^2$$"]
+
+def generate_notebook(rng, cells):
+    image = base64.b64encode(rng.randbytes(24 * 1024)).decode("ascii")
+    notebook_cells = []
+    for index in range(cells):
+        if rng.random() < 0.3:
+            source = "\n".join(rng.choice(MARKDOWN_LINES) for _ in range(rng.randint(1, 5)))
+            notebook_cells.append({"cell_type": "markdown", "metadata": {}, "source": source.splitlines(True)})
+            continue
+        source = "\n".join(rng.choice(CODE_LINES) for _ in range(rng.randint(1, 8)))
+        outputs = [{"output_type": "stream", "name": "stdout", "text": ["line\n"] * rng.randint(0, 20)}]
+        if rng.random() < 0.2:
+            outputs.append({"output_type": "display_data", "metadata": {}, "data": {"image/png": image, "text/plain": ["<Figure>"]}})
+        notebook_cells.append({
+            "cell_type": "code",
+            "execution_count": index + 1,
+            "metadata": {},
+            "outputs": outputs,
+            "source": source.splitlines(True),
+        })
+    return {
+        "cells": notebook_cells,
+        "metadata": {"kernelspec": {"name": "python3", "display_name": "Python 3", "language": "python"}},
+        "nbformat": 4,
+        "nbformat_minor": 5,
+    }
+
+def generate_corpus(directory, notebooks, cells):
+    rng = random.Random(1)
+    for index in range(notebooks):
+        with open(os.path.join(directory, f"nb_{index:04d}.ipynb"), "w", encoding="utf-8") as f:
+            json.dump(generate_notebook(rng, cells), f)
+
+def worker(implementation, directory):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        onefile = load_onefile()
+    import_s = time.perf_counter() - start
+
+    convert = onefile.convert_ipynb_nbconvert if implementation == "nbconvert" else onefile.convert_ipynb
+    digest = hashlib.sha256()
+    total_bytes = 0
+    first_s = None
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory))
+    start = time.perf_counter()
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        total_bytes += len(content)
+        digest.update(convert(content).encode("utf-8"))
+        if first_s is None:
+            first_s = time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+
+    emit({
+        "implementation": implementation,
+        "import_s": round(import_s, 3),
+        "first_notebook_s": round(first_s or 0, 3),
+        "seconds": round(elapsed, 3),
+        "notebooks_per_s": round(len(paths) / elapsed, 1),
+        "mb_per_s": round(total_bytes / (1024 * 1024) / elapsed, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "output_sha256": digest.hexdigest(),
+    })
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notebooks", type=int, default=200)
+    parser.add_argument("--cells", type=int, default=40)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        generate_corpus(temp_dir, args.notebooks, args.cells)
+        runs = [run_worker(__file__, implementation, temp_dir) for implementation in ("nbconvert", "builtin")]
+
+    report({
+        "notebooks": args.notebooks,
+        "cells_per_notebook": args.cells,
+        "runs": runs,
+        "identical_output": runs[0]["output_sha256"] == runs[1]["output_sha256"],
+        "speedup": round(runs[0]["seconds"] / runs[1]["seconds"], 1),
+    })
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(*sys.argv[2:])
+    else:
+        main()
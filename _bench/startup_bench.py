@@ -0,0 +1,72 @@
+# Tracks startup cost: interpreter + import of 1file.py, and time until the first byte of output
+# is produced for a small local folder
+#
+#   python _bench/startup_bench.py [--folder _test] [--runs 5]
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from common import REPO_DIR, emit, load_onefile, report, run_worker
+
+class FirstWriteProbe:
+    def __init__(self):
+        self.first_write = None
+
+    def write(self, text):
+        if self.first_write is None and text:
+            self.first_write = time.time()
+
+def worker(launched_at, folder):
+    launched_at = float(launched_at)
+    with contextlib.redirect_stdout(io.StringIO()):
+        onefile = load_onefile()
+        imported_at = time.time()
+        onefile.set_filters()
+        probe = FirstWriteProbe()
+        onefile.process_local_directory(folder, probe)
+    finished_at = time.time()
+
+    emit({
+        "import_s": imported_at - launched_at,
+        "first_output_s": (probe.first_write or finished_at) - launched_at,
+        "total_s": finished_at - launched_at,
+        "heavy_modules_loaded": sorted(
+            name for name in ("bs4", "PyPDF2", "nltk", "tiktoken", "nbconvert", "youtube_transcript_api", "wget", "pyperclip")
+            if name in sys.modules
+        ),
+    })
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--folder", default=os.path.join(REPO_DIR, "_test"))
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_worker(__file__, time.time(), args.folder) for _ in range(args.runs)]
+    bare = []
+    for _ in range(args.runs):
+        start = time.time()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        bare.append(time.time() - start)
+
+    report({
+        "folder": args.folder,
+        "runs": args.runs,
+        "interpreter_s": round(statistics.median(bare), 4),
+        "import_s": round(statistics.median(run["import_s"] for run in runs), 4),
+        "first_output_s": round(statistics.median(run["first_output_s"] for run in runs), 4),
+        "total_s": round(statistics.median(run["total_s"] for run in runs), 4),
+        "heavy_modules_loaded": runs[-1]["heavy_modules_loaded"],
+    })
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(*sys.argv[2:])
+    else:
+        main()
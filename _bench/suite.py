@@ -0,0 +1,197 @@
+# End-to-end throughput baseline for every source type, against synthetic corpora and local stand-ins
+# (fixtures.py) so runs are reproducible and need no network. Each scenario runs in a fresh interpreter;
+# requests are counted by the stand-in servers.
+#
+#   python _bench/suite.py [--files 3000] [--site-depth 3] [--site-fanout 4] [--pdf-pages 200]
+#                          [--only local,crawl,...] [--output results.json]
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import time
+
+import fixtures
+from common import REPO_DIR, emit, load_onefile, peak_rss_mb, report, run_worker
+
+SCENARIOS = [
+    "local", "crawl", "crawl_sitemap", "github_archive", "github_trees", "github_contents",
+    "github_pull_request", "github_issue", "pdf", "preprocess_text", "get_token_count",
+]
+
+def prepare(onefile, config, scenario):
+    # Cold start for every scenario: an empty cache directory and a working directory for temp files
+    cache = os.path.join(config["work"], "cache", scenario)
+    shutil.rmtree(cache, ignore_errors=True)
+    onefile.cache_dir = cache
+    onefile.http_cache_dir = os.path.join(cache, "http")
+    onefile.github_api_url = config.get("github_url", onefile.github_api_url)
+    os.environ.setdefault("GITHUB_TOKEN", "bench")
+    run_dir = os.path.join(config["work"], "run", scenario)
+    os.makedirs(run_dir, exist_ok=True)
+    os.chdir(run_dir)
+    onefile.set_filters()
+    return os.path.join(run_dir, "output.txt")
+
+def run_scenario(onefile, scenario, config, output_file):
+    # Returns (items processed, input bytes or None, optional extra fields) for the scenario
+    if scenario == "local":
+        onefile.process_local_folder(config["tree"], output_file)
+        files = list(onefile.walk_local_directory(config["tree"]))
+        return len(files), sum(os.path.getsize(path) for path in files)
+
+    if scenario in ("crawl", "crawl_sitemap"):
+        onefile.crawl_sitemap = scenario == "crawl_sitemap"
+        urls_file = os.path.join(os.path.dirname(output_file), "processed_urls.txt")
+        # Page paths end in /index.html, which is_within_depth counts as one more level
+        max_depth = config["site_depth"] + 1
+        onefile.crawl_and_extract_text(f"{config['site_url']}/docs/", output_file, urls_file, max_depth, True, True)
+        with open(urls_file, "r", encoding="utf-8") as f:
+            return sum(1 for _ in f), None
+
+    if scenario.startswith("github_") and scenario[len("github_"):] in ("archive", "trees", "contents"):
+        onefile.github_fetch_mode = scenario[len("github_"):]
+        with open(output_file, "w", encoding="utf-8") as output:
+            onefile.process_github_repo("https://github.com/bench/repo", output)
+        with open(output_file, "r", encoding="utf-8") as f:
+            return f.read().count("# Filename: "), None
+
+    if scenario == "github_pull_request":
+        onefile.process_github_pull_request("https://github.com/bench/repo/pull/1", output_file)
+        return 1, None
+
+    if scenario == "github_issue":
+        onefile.process_github_issue("https://github.com/bench/repo/issues/2", output_file)
+        return 1, None
+
+    if scenario == "pdf":
+        with open(config["pdf"], "rb") as f:
+            data = f.read()
+        with open(output_file, "w", encoding="utf-8") as output:
+            onefile.write_pdf_text(data, output)
+        return config["pdf_pages"], len(data)
+
+    if scenario == "preprocess_text":
+        onefile.preprocess_text(config["text"], output_file)
+        return 1, os.path.getsize(config["text"])
+
+    if scenario == "get_token_count":
+        with open(config["text"], "r", encoding="utf-8") as f:
+            text = f.read()
+        onefile.get_encoder()
+        start = time.perf_counter()
+        tokens = onefile.get_token_count(text)
+        return 1, len(text.encode("utf-8")), {"tokens": tokens, "encode_s": round(time.perf_counter() - start, 3)}
+
+    raise ValueError(f"unknown scenario {scenario}")
+
+def worker(scenario, config):
+    config = json.loads(config)
+    with contextlib.redirect_stdout(io.StringIO()):
+        onefile = load_onefile()
+        output_file = prepare(onefile, config, scenario)
+        start = time.perf_counter()
+        try:
+            result = run_scenario(onefile, scenario, config, output_file)
+        except Exception as e:
+            result = e
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    if isinstance(result, Exception):
+        emit({"scenario": scenario, "error": f"{type(result).__name__}: {result}"})
+        return
+
+    items, input_bytes, *extra = result
+    output_bytes = os.path.getsize(output_file) if os.path.exists(output_file) else 0
+    measured = {
+        "scenario": scenario,
+        "seconds": round(elapsed, 3),
+        "items": items,
+        "items_per_s": round(items / elapsed, 1),
+        "output_mb": round(output_bytes / (1024 * 1024), 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    if input_bytes is not None:
+        measured["input_mb"] = round(input_bytes / (1024 * 1024), 2)
+        measured["mb_per_s"] = round(input_bytes / (1024 * 1024) / elapsed, 2)
+    for values in extra:
+        measured.update(values)
+    emit(measured)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=3000)
+    parser.add_argument("--site-depth", type=int, default=3)
+    parser.add_argument("--site-fanout", type=int, default=4)
+    parser.add_argument("--repo-files", type=int, default=400)
+    parser.add_argument("--pdf-pages", type=int, default=200)
+    parser.add_argument("--text-mb", type=int, default=20)
+    parser.add_argument("--only", help="comma-separated scenarios, default: all")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    # Kept out of the system temp directory: paths containing "tmp" or "temp" match default_exclude_paths
+    parser.add_argument("--work-dir", default=os.path.join(REPO_DIR, "_bench", "work"))
+    args = parser.parse_args()
+    scenarios = args.only.split(",") if args.only else SCENARIOS
+
+    work = os.path.abspath(args.work_dir)
+    shutil.rmtree(work, ignore_errors=True)
+    os.makedirs(work)
+    try:
+        setup_start = time.perf_counter()
+        config = {"work": work, "site_depth": args.site_depth, "pdf_pages": args.pdf_pages}
+        config["tree"] = os.path.join(work, "tree")
+        tree_bytes = fixtures.generate_tree(config["tree"], args.files)
+        repo_tree = os.path.join(work, "repo")
+        fixtures.generate_tree(repo_tree, args.repo_files, seed=2)
+        pages = fixtures.generate_site(os.path.join(work, "site"), args.site_depth, args.site_fanout)
+        config["pdf"] = os.path.join(work, "document.pdf")
+        fixtures.generate_pdf(config["pdf"], args.pdf_pages)
+        config["text"] = os.path.join(work, "corpus.txt")
+        with open(config["text"], "w", encoding="utf-8") as f:
+            for index in range(args.text_mb):
+                f.write(fixtures.random_text(fixtures.random.Random(index), 1024 * 1024, ".txt"))
+
+        site = fixtures.serve(fixtures.SiteHandler, site_directory=os.path.join(work, "site"))
+        github = fixtures.serve(fixtures.GitHubHandler, github=fixtures.FakeGitHub(repo_tree))
+        config["site_url"] = site.url
+        config["github_url"] = github.url
+        fixtures.write_sitemaps(os.path.join(work, "site"), site.url)
+        servers = {"crawl": site, "crawl_sitemap": site}
+
+        results = {
+            "fixtures": {
+                "tree_files": args.files,
+                "tree_mb": round(tree_bytes / (1024 * 1024), 2),
+                "site_pages": pages,
+                "repo_files": args.repo_files,
+                "pdf_pages": args.pdf_pages,
+                "text_mb": args.text_mb,
+                "setup_s": round(time.perf_counter() - setup_start, 2),
+            },
+            "scenarios": [],
+        }
+        for scenario in scenarios:
+            server = servers.get(scenario, github if scenario.startswith("github_") else None)
+            before = server.counters() if server else (0, 0)
+            measured = run_worker(__file__, scenario, json.dumps(config))
+            if server:
+                requests, bytes_sent = (after - start for after, start in zip(server.counters(), before))
+                measured["requests"] = requests
+                measured["network_mb"] = round(bytes_sent / (1024 * 1024), 2)
+                measured.setdefault("mb_per_s", round(bytes_sent / (1024 * 1024) / max(measured.get("seconds", 0), 1e-9), 2))
+            results["scenarios"].append(measured)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(*sys.argv[2:])
+    else:
+        main()